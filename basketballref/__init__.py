@@ -1,2 +1,29 @@
-""" __init__.py file specifying general library properties. """
+""" __init__.py file specifying general library properties.
 
+The main scrapers are available at the top level, but the submodules (and pandas, pyquery, etc.
+behind them) are only imported the first time one of them is used, so importing the package is
+close to free for worker processes and command line calls that don't need them all. """
+import importlib
+
+## Top level name -> the submodule it lives in
+_LAZY = {"BoxScore":"box_score",
+		 "Player":"player",
+		 "GetPlayerList":"player",
+		 "Roster":"roster",
+		 "SeasonSchedule":"schedule"}
+
+__all__ = list(_LAZY)
+
+def __getattr__(name):
+
+	""" Import the submodule behind a top level name on first access (and keep the
+	result, so it's only looked up once). """
+
+	if name not in _LAZY:
+		raise AttributeError("module {!r} has no attribute {!r}".format(__name__,name))
+	value = getattr(importlib.import_module("."+_LAZY[name],__name__),name)
+	globals()[name] = value
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,203 @@
+"""__main__.py
+
+Command line entry point for bulk collection, so harvests can run as scheduled jobs:
+
+	python -m basketballref [options] schedule 2015-2018
+	python -m basketballref [options] boxscores 2018
+	python -m basketballref [options] players 2018 [--uri jamesle01 ...] [--basic]
+	python -m basketballref [options] rosters 2017 2018
+	python -m basketballref [options] crawl 2010-2018 [--queue crawl.sqlite] [--pages-only]
+
+Seasons are given as years (the year of the january in the season) or ranges like 2015-2018.
+Everything is written to a Warehouse (Parquet datasets partitioned by season) under --output,
+and reruns only add what isn't stored yet. The exit status is 1 if anything failed.
+
+The submodules are imported by the commands that need them, so --help and argument errors
+don't pay for pandas. """
+import sys
+import argparse
+
+### Argument helpers
+######################################################################################
+def _seasons(values):
+
+	""" Expand season arguments (years, or ranges like 2015-2018) into a sorted list. """
+
+	seasons = set()
+	for value in values:
+		first, _, last = value.partition("-")
+		try:
+			first, last = int(first), int(last or first)
+		except ValueError:
+			raise argparse.ArgumentTypeError("{} isn't a season or a range of seasons.".format(value))
+		seasons.update(range(first,last+1))
+	return sorted(seasons)
+
+def _configure(args):
+
+	""" Apply the fetch settings, and open the warehouse. """
+
+	from . import fetch
+	from .warehouse import Warehouse
+	if args.no_cache:
+		fetch.ConfigureCache(None)
+	elif args.cache is not None:
+		fetch.ConfigureCache(args.cache)
+	fetch.ConfigureRateLimit(args.rate/60. if args.rate else None)
+	return Warehouse(args.output)
+
+def _report(name,season,written,failed):
+
+	""" Print a summary line for a season, and the failures (to stderr). """
+
+	print("{} {}: {} new rows{}".format(name,season,written,", {} failed".format(len(failed)) if failed else ""))
+	for item, error in failed:
+		print("  {}: {}: {}".format(item,type(error).__name__,error),file=sys.stderr)
+
+### Commands
+######################################################################################
+def Schedules(args,warehouse):
+
+	""" Store each season's schedule. """
+
+	from .schedule import SeasonSchedule
+	for season in args.seasons:
+		_report("schedules",season,warehouse.store(SeasonSchedule(season)),[])
+	return 0
+
+def BoxScores(args,warehouse,schedules=None):
+
+	""" Store the box scores of every played game in each season, skipping games that are
+	already in the warehouse. Games are streamed in batches, so memory stays flat. """
+
+	from .box_score import SCHEMA
+	from .harvest import PlayedGames
+	from .stream import IterBoxScores, Batched
+
+	status = 0
+	for season in args.seasons:
+
+		## Find the games that still need to be collected
+		stored = set(warehouse.read("boxscores",columns=["uri"],seasons=[season])["uri"])
+		games = (schedules or {}).get(season,season)
+		uris = [uri for uri in PlayedGames(games) if uri not in stored]
+
+		## And stream them into the warehouse
+		failed = []
+		written = 0
+		frames = IterBoxScores(uris,prefetch=args.workers,on_error=lambda uri, error: failed.append((uri,error)))
+		for batch in Batched(frames,rows=args.batch_rows,schema=SCHEMA):
+			written += warehouse.append("boxscores",batch)
+		_report("boxscores",season,written,failed)
+		status = status or int(bool(failed))
+	return status
+
+def Players(args,warehouse):
+
+	""" Store gamelogs for each season, for the players given with --uri or by default every
+	player on the season's rosters. Gamelogs are written in batches, like box scores, rather
+	than a file per player. """
+
+	from .roster import LeagueRosters
+	from .fetch import Window
+	from .player import GAMELOG_SCHEMA
+	from .stream import GamelogFrame, Batched
+
+	status = 0
+	for season in args.seasons:
+		uris = args.uri or sorted(set(LeagueRosters(season,workers=args.workers).index))
+		items = [(uri,season,not args.basic) for uri in uris]
+		failed = []
+		written = 0
+		frames = (df for _, df in Window(GamelogFrame,items,args.workers,lambda item, error: failed.append((item[0],error))))
+		for batch in Batched(frames,rows=args.batch_rows,schema=GAMELOG_SCHEMA):
+			written += warehouse.append("gamelogs",batch)
+		_report("gamelogs",season,written,failed)
+		status = status or int(bool(failed))
+	return status
+
+def Rosters(args,warehouse):
+
+	""" Store every team's roster for each season. """
+
+	from .roster import LeagueRosters
+	for season in args.seasons:
+		df = LeagueRosters(season,workers=args.workers).reset_index()
+		df["season"] = season
+		_report("rosters",season,warehouse.append("rosters",df),[])
+	return 0
+
+def Crawl(args,warehouse):
+
+	""" Crawl the seasons' schedule and box score pages into the page cache through the
+	durable queue (so an interrupted crawl resumes on the next run), and then store the
+	schedules and box scores from the cache unless --pages-only is set. """
+
+	from .crawl import CrawlQueue, CrawlSeasons, DEAD, DEFAULT_QUEUE_PATH
+	from .schedule import SeasonSchedule
+
+	queue = args.queue or DEFAULT_QUEUE_PATH
+	counts = CrawlSeasons(args.seasons,path=queue,workers=args.workers,progress=not args.quiet)
+	print("crawl: "+", ".join("{} {}".format(n,state) for state, n in counts.items()))
+	if counts[DEAD]:
+		with CrawlQueue(queue) as jobs:
+			for url, error in jobs.jobs(DEAD)[["url","error"]].itertuples(index=False):
+				print("  {}: {}".format(url,error),file=sys.stderr)
+	if args.pages_only:
+		return int(bool(counts[DEAD]))
+
+	schedules = {}
+	for season in args.seasons:
+		schedules[season] = SeasonSchedule(season)
+		_report("schedules",season,warehouse.store(schedules[season]),[])
+	status = BoxScores(args,warehouse,schedules)
+	return status or int(bool(counts[DEAD]))
+
+### Argument parsing
+######################################################################################
+def BuildParser():
+
+	""" The argument parser, with a sub-parser per command. """
+
+	parser = argparse.ArgumentParser(prog="python -m basketballref",
+									 description="Collect basketball-reference.com data into a Parquet warehouse.")
+	parser.add_argument("--workers",type=int,default=8,help="pages fetched and parsed at once (default 8)")
+	parser.add_argument("--rate",type=float,default=20.,help="requests per minute to the site, 0 for no limit (default 20)")
+	parser.add_argument("--cache",help="page cache file (default ~/.cache/basketballref/pages.sqlite or $BASKETBALLREF_CACHE)")
+	parser.add_argument("--no-cache",action="store_true",help="don't use the page cache")
+	parser.add_argument("--output",default="warehouse",help="warehouse directory (default ./warehouse)")
+	parser.add_argument("--quiet",action="store_true",help="no progress bars")
+	commands = parser.add_subparsers(dest="command",required=True)
+
+	def command(name,func,help):
+		sub = commands.add_parser(name,help=help)
+		sub.add_argument("seasons",nargs="+",help="seasons, like 2018 or 2015-2018")
+		sub.set_defaults(func=func)
+		return sub
+
+	command("schedule",Schedules,"season schedules")
+	sub = command("boxscores",BoxScores,"box scores of every played game")
+	sub.add_argument("--batch-rows",type=int,default=50000,help="rows per warehouse write (default 50000)")
+	sub = command("players",Players,"player gamelogs (every rostered player by default)")
+	sub.add_argument("--uri",nargs="+",help="only these player uris, like jamesle01")
+	sub.add_argument("--basic",action="store_true",help="basic gamelogs only (skip the advanced pages)")
+	sub.add_argument("--batch-rows",type=int,default=50000,help="rows per warehouse write (default 50000)")
+	command("rosters",Rosters,"every team's roster")
+	sub = command("crawl",Crawl,"resumable crawl of schedules and box scores, then store them")
+	sub.add_argument("--queue",help="crawl job table (default next to the page cache)")
+	sub.add_argument("--pages-only",action="store_true",help="only fill the page cache, don't write the warehouse")
+	sub.add_argument("--batch-rows",type=int,default=50000,help="rows per warehouse write (default 50000)")
+	return parser
+
+def main(argv=None):
+	parser = BuildParser()
+	args = parser.parse_args(argv)
+	try:
+		args.seasons = _seasons(args.seasons)
+	except argparse.ArgumentTypeError as error:
+		parser.error(str(error))
+	return args.func(args,_configure(args))
+
+
+if __name__ == "__main__":
+	sys.exit(main())
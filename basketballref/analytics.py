@@ -0,0 +1,342 @@
+"""analytics.py
+
+Season analytics built on schedules: standings (final, and as of every game day), win and loss
+streaks, home and road splits, and Elo ratings. Everything takes one or many schedules (a
+SeasonSchedule, a schedule dataframe like SeasonSchedule.df or Warehouse.read("schedules"), or a
+list of either), so a single call can cover decades.
+
+Standings and streaks come from array operations on a table with a row per team per game, sorted
+by season, team, and date, using cumulative sums and run starts rather than a loop over games.
+Elo is sequential by nature, so it runs as one tight loop over integer-encoded teams (compiled
+with numba if it's installed, and over plain lists otherwise).
+
+Teams are identified by name, so a franchise that moved or was renamed is a new team, although
+its Elo rating carries over only if the name does. """
+import numpy as np
+import pandas as pd
+
+## From the bball lib
+from .schedule import SeasonSchedule
+from .fetch import SeasonOf
+
+## Default Elo settings, along the lines of FiveThirtyEight's NBA model
+ELO_INITIAL = 1500.
+ELO_K = 20.
+ELO_HOME_ADVANTAGE = 100.
+ELO_CARRYOVER = 0.75
+
+### Input preparation
+######################################################################################
+def _played(schedules):
+
+	""" One frame of played games (date, season, away, home, away_PTS, home_PTS, uri) from
+	one or many schedules, sorted by date, with the team names as plain strings (the team
+	categories differ from season to season). """
+
+	if isinstance(schedules,(SeasonSchedule,pd.DataFrame)):
+		schedules = [schedules]
+	frames = []
+	for schedule in schedules:
+		if isinstance(schedule,SeasonSchedule):
+			df = schedule.df.assign(season=schedule.season)
+		elif "season" in schedule.columns:
+			df = schedule
+		else:
+			df = schedule.assign(season=SeasonOf(schedule["date"]))
+		frames.append(df[["date","season","away","home","away_PTS","home_PTS","uri"]])
+
+	## Keep the games with a final score, whose points can then go
+	## from the nullable schedule type to plain numpy integers.
+	df = pd.concat(frames,axis=0,ignore_index=True)
+	df = df.loc[df["home_PTS"].notnull() & df["away_PTS"].notnull()]
+	df = df.drop_duplicates(subset=["uri"]).assign(date=pd.to_datetime(df["date"]),
+												   season=df["season"].astype(np.int16),
+												   away=df["away"].astype(str),home=df["home"].astype(str),
+												   away_PTS=df["away_PTS"].astype(np.int16),
+												   home_PTS=df["home_PTS"].astype(np.int16))
+	return df.sort_values(["date","uri"],kind="stable").reset_index(drop=True)
+
+def _run_starts(new):
+
+	""" For a boolean array marking where runs start, the index where each
+	element's run started. """
+
+	return np.maximum.accumulate(np.where(new,np.arange(len(new)),0))
+
+### Team-game table
+######################################################################################
+def TeamGames(schedules):
+
+	""" A row per team per game, sorted by season, team, and date, with the opponent, whether it
+	was a home game, the points for and against, the margin, the win, the game number (G), the
+	record after the game (W and L), and the streak after the game (positive for a win streak,
+	negative for a losing streak, so -3 is L3). """
+
+	games = _played(schedules)
+	n = len(games)
+
+	## Two rows per game, home team first
+	home = np.concatenate([np.ones(n,dtype=bool),np.zeros(n,dtype=bool)])
+	team = np.concatenate([games["home"].values,games["away"].values])
+	opp = np.concatenate([games["away"].values,games["home"].values])
+	points = np.concatenate([games["home_PTS"].values,games["away_PTS"].values]).astype(np.int16)
+	allowed = np.concatenate([games["away_PTS"].values,games["home_PTS"].values]).astype(np.int16)
+	df = pd.DataFrame({"season":np.tile(games["season"].values,2),
+					   "date":np.tile(games["date"].values,2),
+					   "uri":np.tile(games["uri"].values,2),
+					   "team":team,"opp":opp,"home":home,
+					   "PTS":points,"OPP":allowed})
+	df["margin"] = (df["PTS"]-df["OPP"]).astype(np.int16)
+	df["win"] = df["margin"].values > 0
+	df = df.sort_values(["season","team","date"],kind="stable").reset_index(drop=True)
+
+	## Where each team-season starts
+	season = df["season"].values
+	names = df["team"].values
+	win = df["win"].values
+	first = np.ones(len(df),dtype=bool)
+	first[1:] = (season[1:] != season[:-1]) | (names[1:] != names[:-1])
+	start = _run_starts(first)
+
+	## Game numbers, and the record from cumulative wins (less the
+	## wins before the team-season started)
+	index = np.arange(len(df))
+	df["G"] = (index-start+1).astype(np.int16)
+	wins = np.cumsum(win)
+	df["W"] = (wins-(wins-win)[start]).astype(np.int16)
+	df["L"] = (df["G"]-df["W"]).astype(np.int16)
+
+	## Streaks, from where each run of wins or
+	## losses started
+	new_run = first.copy()
+	new_run[1:] |= win[1:] != win[:-1]
+	length = index-_run_starts(new_run)+1
+	df["streak"] = np.where(win,length,-length).astype(np.int16)
+
+	for column in ("team","opp"):
+		df[column] = df[column].astype("category")
+	return df
+
+def _format_streak(streak):
+	return ("W" if streak > 0 else "L")+str(abs(streak))
+
+### Standings
+######################################################################################
+def Standings(schedules):
+
+	""" Final standings (or standings so far, for a season in progress) for every season, indexed
+	by (season, team) and sorted by winning percentage: W, L, W/L%, games behind the league leader
+	(the schedule doesn't have conferences), points for and against per game, home and road
+	records, the current streak, and the longest win and losing streaks. """
+
+	df = TeamGames(schedules)
+	groups = df.groupby(["season","team"],observed=True)
+	standings = groups[["W","L"]].last()
+	standings["W/L%"] = (standings["W"]/(standings["W"]+standings["L"])).astype(np.float32)
+	balance = standings["W"]-standings["L"]
+	standings["GB"] = ((balance.groupby(level="season").transform("max")-balance)/2.).astype(np.float32)
+	standings["PTS/G"] = groups["PTS"].mean().astype(np.float32)
+	standings["OPP/G"] = groups["OPP"].mean().astype(np.float32)
+
+	## Home and road splits, in one grouped sum each
+	for label, mask in (("home",df["home"]),("road",~df["home"])):
+		split = df.loc[mask].groupby(["season","team"],observed=True)["win"].agg(["sum","count"])
+		standings[label+"_W"] = split["sum"].astype(np.int16)
+		standings[label+"_L"] = (split["count"]-split["sum"]).astype(np.int16)
+
+	## Streaks
+	standings["streak"] = groups["streak"].last().map(_format_streak)
+	standings["longest_W"] = groups["streak"].max().clip(lower=0).astype(np.int16)
+	standings["longest_L"] = (-groups["streak"].min()).clip(lower=0).astype(np.int16)
+
+	order = np.lexsort((-standings["W/L%"].values,standings.index.get_level_values("season")))
+	return standings.iloc[order]
+
+def StandingsByDate(schedules):
+
+	""" Standings as of every game day of every season, as a long table (season, date, team, W, L,
+	W/L%, GB) with a row for every team in the season on every day that had games. Built from a
+	days x teams matrix of cumulative wins and losses. """
+
+	df = TeamGames(schedules)
+	teams = df["team"].cat.codes.values
+	n_teams = len(df["team"].cat.categories)
+
+	## Seasons don't share dates, so the game days index
+	## the rows of the matrix directly.
+	days, day = np.unique(df["date"].values,return_inverse=True)
+	day_season = np.zeros(len(days),dtype=np.int16)
+	day_season[day] = df["season"].values
+
+	## Cumulative wins and losses over all the days, less
+	## the totals before each day's season started
+	wins = np.zeros((len(days),n_teams),dtype=np.int32)
+	losses = np.zeros((len(days),n_teams),dtype=np.int32)
+	np.add.at(wins,(day,teams),df["win"].values)
+	np.add.at(losses,(day,teams),~df["win"].values)
+	first = np.ones(len(days),dtype=bool)
+	first[1:] = day_season[1:] != day_season[:-1]
+	start = _run_starts(first)
+	wins = np.cumsum(wins,axis=0)
+	losses = np.cumsum(losses,axis=0)
+	wins -= np.where(start[:,None] > 0,wins[start-1],0)
+	losses -= np.where(start[:,None] > 0,losses[start-1],0)
+
+	## Only keep the teams that played in each season, and
+	## get the games behind from the best record on each day.
+	seasons, season_index = np.unique(day_season,return_inverse=True)
+	present = np.zeros((len(seasons),n_teams),dtype=bool)
+	present[np.searchsorted(seasons,df["season"].values),teams] = True
+	present = present[season_index]
+	balance = np.where(present,wins-losses,np.iinfo(np.int32).min)
+	behind = (balance.max(axis=1)[:,None]-balance)/2.
+
+	rows, columns = np.nonzero(present)
+	W = wins[rows,columns]
+	L = losses[rows,columns]
+	with np.errstate(invalid="ignore",divide="ignore"):
+		percentage = np.where(W+L > 0,W/(W+L),np.nan)
+	return pd.DataFrame({"season":day_season[rows],
+						 "date":days[rows],
+						 "team":pd.Categorical.from_codes(columns,categories=df["team"].cat.categories),
+						 "W":W.astype(np.int16),
+						 "L":L.astype(np.int16),
+						 "W/L%":percentage.astype(np.float32),
+						 "GB":behind[rows,columns].astype(np.float32)})
+
+def Streaks(schedules,min_length=10):
+
+	""" Every win or losing streak of at least min_length games, with the team, season, length
+	(negative for losing streaks), and the dates it started and ended, longest first. """
+
+	df = TeamGames(schedules)
+	streak = df["streak"].values
+
+	## A streak ends where the next game isn't part of it
+	ends = np.ones(len(df),dtype=bool)
+	ends[:-1] = np.abs(streak[1:]) <= np.abs(streak[:-1])
+	ends &= np.abs(streak) >= min_length
+	index = np.nonzero(ends)[0]
+	starts = index-np.abs(streak[index])+1
+	out = pd.DataFrame({"season":df["season"].values[index],
+						"team":df["team"].values[index],
+						"length":streak[index],
+						"start":df["date"].values[starts],
+						"end":df["date"].values[index]})
+	order = np.argsort(-np.abs(out["length"].values),kind="stable")
+	return out.iloc[order].reset_index(drop=True)
+
+### Elo ratings
+######################################################################################
+def _elo_loop(home,away,margin,season,rating,last,home_elo,away_elo,shift,
+			  k,home_advantage,carryover,initial,mov):
+
+	""" The sequential part of Elo, over games in date order with integer team codes. rating and
+	last (each team's most recent season) are updated in place, and the pre-game ratings and
+	rating shifts are written to home_elo, away_elo, and shift. Written with only indexing and
+	arithmetic, so it compiles as is with numba. """
+
+	for i in range(len(home)):
+		h = home[i]
+		a = away[i]
+		s = season[i]
+
+		## Regress towards the mean between seasons
+		if last[h] != s:
+			if last[h] >= 0:
+				rating[h] = initial+carryover*(rating[h]-initial)
+			last[h] = s
+		if last[a] != s:
+			if last[a] >= 0:
+				rating[a] = initial+carryover*(rating[a]-initial)
+			last[a] = s
+
+		## Expected result, and the update (scaled by the margin of victory,
+		## discounted for favourites, if mov is set)
+		difference = rating[h]+home_advantage-rating[a]
+		expected = 1./(1.+10.**(-difference/400.))
+		m = margin[i]
+		result = 1. if m > 0 else 0.
+		multiplier = 1.
+		if mov:
+			favourite = difference if m > 0 else -difference
+			multiplier = (abs(m)+3.)**0.8/(7.5+0.006*favourite)
+		change = k*multiplier*(result-expected)
+
+		home_elo[i] = rating[h]
+		away_elo[i] = rating[a]
+		shift[i] = change
+		rating[h] = rating[h]+change
+		rating[a] = rating[a]-change
+
+## Compile the loop if numba is available
+try:
+	from numba import njit
+	_elo_compiled = njit(cache=True)(_elo_loop)
+except ImportError:
+	_elo_compiled = None
+
+def Elo(schedules,k=ELO_K,home_advantage=ELO_HOME_ADVANTAGE,carryover=ELO_CARRYOVER,initial=ELO_INITIAL,mov=True):
+
+	""" Elo ratings through every game of the schedules, in date order.
+
+	k: the update size.
+	home_advantage: Elo points added to the home team's rating for the expected result.
+	carryover: the fraction of a team's distance from initial that it keeps from one season to the next.
+	initial: the rating of a team's first game.
+	mov: if True, scale updates by the margin of victory (discounted for favourites).
+
+	Returns the played games (date, season, away, home, away_PTS, home_PTS, uri) with the pre-game
+	ratings (home_elo, away_elo), the home team's win probability, and the rating change (elo_shift,
+	added to the home team and taken from the away team). """
+
+	games = _played(schedules)
+	n = len(games)
+
+	## Integer-encode the teams
+	codes, teams = pd.factorize(np.concatenate([games["home"].values,games["away"].values]))
+	home, away = codes[:n].astype(np.int64), codes[n:].astype(np.int64)
+	margin = (games["home_PTS"].values-games["away_PTS"].values).astype(np.float64)
+	season = games["season"].values.astype(np.int64)
+
+	## Run the loop, compiled over arrays, or over lists
+	## (which index much faster than arrays in plain python).
+	home_elo = np.empty(n)
+	away_elo = np.empty(n)
+	shift = np.empty(n)
+	if _elo_compiled is not None:
+		_elo_compiled(home,away,margin,season,np.full(len(teams),float(initial)),np.full(len(teams),-1,dtype=np.int64),
+					  home_elo,away_elo,shift,float(k),float(home_advantage),float(carryover),float(initial),bool(mov))
+	else:
+		home_elo, away_elo, shift = [0.]*n, [0.]*n, [0.]*n
+		_elo_loop(home.tolist(),away.tolist(),margin.tolist(),season.tolist(),[float(initial)]*len(teams),[-1]*len(teams),
+				  home_elo,away_elo,shift,k,home_advantage,carryover,initial,mov)
+
+	home_elo, away_elo = np.asarray(home_elo), np.asarray(away_elo)
+	games["home_elo"] = home_elo.astype(np.float32)
+	games["away_elo"] = away_elo.astype(np.float32)
+	games["home_prob"] = (1./(1.+10.**(-(home_elo+home_advantage-away_elo)/400.))).astype(np.float32)
+	games["elo_shift"] = np.asarray(shift,dtype=np.float32)
+	return games
+
+def LatestElo(elo):
+
+	""" Each team's rating after its most recent game, from the output of Elo, highest first. """
+
+	n = len(elo)
+	ratings = pd.DataFrame({"team":np.concatenate([elo["home"].values,elo["away"].values]),
+							"season":np.tile(elo["season"].values,2),
+							"date":np.tile(elo["date"].values,2),
+							"elo":np.concatenate([elo["home_elo"].values+elo["elo_shift"].values,
+												  elo["away_elo"].values-elo["elo_shift"].values]),
+							"order":np.concatenate([np.arange(n),np.arange(n)])})
+	latest = ratings.sort_values("order",kind="stable").groupby("team").last()
+	return latest.drop(columns=["order"]).sort_values("elo",ascending=False)
+
+
+if __name__ == "__main__":
+
+	schedules = [SeasonSchedule(season) for season in (2017,2018)]
+	print(Standings(schedules).loc[2018].head(10))
+	print(Streaks(schedules,min_length=8))
+	print(LatestElo(Elo(schedules)).head(10))
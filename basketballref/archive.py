@@ -0,0 +1,258 @@
+"""archive.py
+
+Single-file archives of raw pages, for freezing the HTML behind a crawl and replaying it later
+without the network. An archive is a sequence of individually zlib compressed pages followed
+by an index of url -> (offset, length), so reading a page only decompresses that page. Archives
+are read through mmap, so opening one doesn't load it.
+
+Layout:
+	MAGIC, page blobs..., compressed JSON index, index offset (8 bytes), index length (8 bytes), MAGIC
+
+Appending to an archive writes the new pages after the old footer and a new index and footer after
+them, leaving the old ones in place. The last complete footer in the file is the one that's read,
+so an append that's interrupted before it finishes leaves the archive as it was.
+
+Pointing the fetch layer at an archive (see Replay) works for every scraper, since they all
+build their URLs from the module level templates (BOXSCORE_URL, GAMELOG_URL, etc.) and fetch
+through FetchPage. """
+import io
+import os
+import json
+import mmap
+import zlib
+import struct
+import warnings
+import threading
+from contextlib import contextmanager
+
+## For the missing page errors, which match the site's
+from urllib.error import HTTPError
+
+## From the bball lib
+from . import fetch
+
+## File format markers
+MAGIC = b"BBREFARC"
+FOOTER = struct.Struct("<QQ8s")
+
+### Reading
+######################################################################################
+class PageArchive(object):
+
+	""" Read only view of an archive file. The object is also a transport (a callable taking
+	a url and returning the page text), so it can be handed to fetch.SetTransport. """
+
+	def __init__(self,path):
+
+		""" path = the archive file. """
+
+		self.path = path
+		self._file = open(path,"rb")
+		self._map = mmap.mmap(self._file.fileno(),0,access=mmap.ACCESS_READ)
+		self.index = _read_index(self._map)
+
+	def __repr__(self):
+		return "Page archive at {} ({} pages)".format(self.path,len(self))
+
+	def __len__(self):
+		return len(self.index)
+
+	def __contains__(self,url):
+		return url in self.index
+
+	def __iter__(self):
+		return iter(self.index)
+
+	def get(self,url):
+
+		""" The page text for url, or None if it isn't in the archive. """
+
+		if url not in self.index:
+			return None
+		offset, length = self.index[url]
+		return zlib.decompress(self._map[offset:offset+length]).decode("utf-8")
+
+	def __call__(self,url):
+
+		""" Transport interface: the page text for url, with a 404 HTTPError for pages
+		that aren't archived (which the scrapers handle the same way as the site's). """
+
+		text = self.get(url)
+		if text is None:
+			raise HTTPError(url,404,"Not in archive {}".format(self.path),None,io.BytesIO())
+		return text
+
+	def close(self):
+		self._map.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+def _find_index(data):
+
+	""" Find the last complete index in an archive's bytes, searching back from the end past
+	anything an interrupted append left behind. Returns the url -> (offset, length) index and
+	where its footer ends. """
+
+	if len(data) < len(MAGIC)+FOOTER.size or data[:len(MAGIC)] != MAGIC:
+		raise ValueError("Not a page archive.")
+	end = len(data)
+	while True:
+
+		## The next candidate footer, which has to point at an
+		## index that sits right in front of it and decodes.
+		found = data.rfind(MAGIC,len(MAGIC),end)
+		if found < 0:
+			raise ValueError("Page archive has no complete index.")
+		start = found+len(MAGIC)-FOOTER.size
+		end = found+len(MAGIC)-1
+		if start < len(MAGIC):
+			continue
+		offset, length, _ = FOOTER.unpack(data[start:found+len(MAGIC)])
+		if offset < len(MAGIC) or offset+length != start:
+			continue
+		try:
+			index = json.loads(zlib.decompress(data[offset:start]).decode("utf-8"))
+		except (zlib.error,ValueError):
+			continue
+		return {url:tuple(entry) for url, entry in index.items()}, found+len(MAGIC)
+
+def _read_index(data):
+
+	""" Read the url -> (offset, length) index from an archive's bytes. """
+
+	return _find_index(data)[0]
+
+### Writing
+######################################################################################
+class ArchiveWriter(object):
+
+	""" Appends pages to an archive file, which is created if needed. The index is written
+	when the writer is closed (it's a context manager), and the archive can't be read until
+	then. """
+
+	def __init__(self,path):
+
+		""" path = the archive file. """
+
+		self.path = path
+		self._lock = threading.Lock()
+
+		## Start from the existing archive, if there is one, adding new
+		## pages after its footer (and dropping anything an interrupted
+		## append left after that), so its index stays readable until
+		## the new one is written on close.
+		if os.path.exists(path):
+			with open(path,"rb") as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as data:
+				self.index, self._end = _find_index(data)
+			self._file = open(path,"r+b")
+			self._file.seek(self._end)
+			self._file.truncate()
+		else:
+			if os.path.dirname(path):
+				os.makedirs(os.path.dirname(path),exist_ok=True)
+			self.index = {}
+			self._file = open(path,"w+b")
+			self._file.write(MAGIC)
+			self._end = len(MAGIC)
+
+	def __len__(self):
+		return len(self.index)
+
+	def add(self,url,text):
+
+		""" Add the page text for url (replacing any earlier copy in the index). """
+
+		blob = zlib.compress(text.encode("utf-8"))
+		with self._lock:
+			self._file.write(blob)
+			self.index[url] = (self._end,len(blob))
+			self._end += len(blob)
+
+	def close(self):
+
+		""" Write the index and footer after the new pages, which makes them visible. """
+
+		with self._lock:
+			index = zlib.compress(json.dumps(self.index).encode("utf-8"))
+			self._file.write(index)
+			self._file.write(FOOTER.pack(self._end,len(index),MAGIC))
+			self._file.truncate()
+			self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+def FreezePages(path,urls,workers=8):
+
+	""" Fetch every url (through the cache, so pages from an earlier crawl aren't downloaded
+	again) and add them to the archive at path. Returns the number of pages in the archive.
+
+	Pages are written as they arrive, with only workers of them in flight at once. Missing
+	pages (404s) are skipped with a warning, which is how Replay treats them anyway. Any other
+	failure is raised, with the pages fetched before it kept in the archive. """
+
+	missing = []
+	def on_error(url,error):
+		if not (isinstance(error,HTTPError) and error.code == 404):
+			raise error
+		missing.append(url)
+
+	with ArchiveWriter(path) as writer:
+		for url, text in fetch.IterPages(urls,workers=workers,on_error=on_error):
+			writer.add(url,text)
+		count = len(writer)
+
+	## Report the pages that weren't there
+	if missing:
+		warnings.warn("{} pages were missing (404) and weren't archived: {}".format(len(missing),", ".join(missing)))
+	return count
+
+### Replay
+######################################################################################
+@contextmanager
+def Replay(path,cache=False):
+
+	""" Context manager that points every scraper at the archive at path instead of the network,
+	yielding the PageArchive. The page cache is turned off during the replay unless cache = True,
+	so that nothing is read from (or written to) it. Pages that aren't archived come back as 404s.
+
+		with Replay("2018.bbarc"):
+			df = HarvestBoxScores(2018)
+	"""
+
+	archive = PageArchive(path)
+	transport = fetch._transport
+	settings = dict(fetch._cache_settings)
+	fetch.SetTransport(archive)
+	if not cache:
+		fetch.ConfigureCache(None)
+	try:
+		yield archive
+	finally:
+		fetch.SetTransport(transport)
+		if not cache:
+			fetch.ConfigureCache(**settings)
+		archive.close()
+
+
+if __name__ == "__main__":
+
+	from .schedule import SeasonSchedule, SCHEDULE_URL
+	from .box_score import BOXSCORE_URL
+
+	## Freeze a season's schedule and box scores, then
+	## rebuild the schedule from the archive.
+	schedule = SeasonSchedule(2018)
+	urls = [SCHEDULE_URL.format(2018,month) for month in schedule._month_dfs]
+	urls += [BOXSCORE_URL.format(uri) for uri in schedule.df.uri]
+	print(FreezePages("2018.bbarc",urls))
+	with Replay("2018.bbarc"):
+		print(SeasonSchedule(2018).df)
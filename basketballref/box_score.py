@@ -2,109 +2,176 @@
 
 Functionality to create box score objects by pulling data from HTML queries of 
 basketball_reference.com. """
+import re
 import numpy as np
 import pandas as pd
-from pyquery import PyQuery as pq
+
+## Shared, cached page fetching and
+## table extraction
+from .fetch import FetchPage
+from .tables import ParseTable
+from .schema import STAT_SCHEMA, ConvertTypes
+from . import instrument
 
 ## Base URL for queries
 BOXSCORE_URL = "https://www.basketball-reference.com/boxscores/{0:s}.html"
 
+## Column types for the box score dataframe
+SCHEMA = dict(STAT_SCHEMA,player_uri="str",Team="category",Tm="category",date="datetime")
+
 ### String processing functions and regular expresions
 ######################################################################################
+## Box score table ids, which are like box-CLE-game-basic (or box-CLE-q1-basic for a quarter)
+## on current pages and box_cle_basic on older ones. The groups are the team abbreviation, the
+## period (missing on older pages, which only have whole game tables), and the kind of table.
+table_id_re = re.compile(r"^box[-_](\w+?)[-_](?:(\w+?)[-_])?(basic|advanced)$")
+
+## The quarter and half tables on current pages (overtimes are ot1, ot2, etc.)
+PERIODS = ("q1","q2","q3","q4","h1","h2")
+
 def _title_process(title):
 	away_team = title[:title.find(" at ")]
 	home_team = title[title.find(" at ")+len(" at "):title.find(" Box Score,")]
 	date = pd.to_datetime(title[title.find("Box Score,")+len("Box Score, "):])
 	return home_team, away_team, date
 
-def _process_webpage(webpage):
+def _find_tables(webpage,periods=()):
+
+	""" Find the box score tables by id, without parsing any of them. Returns the team abbreviations
+	in page order (away team first) and a dict of (team, period, kind) -> table element, with only
+	the whole game ("game") tables and the ones for the requested periods. """
+
+	teams = []
+	tables = {}
+	for table in webpage("table"):
+		match = table_id_re.match(table.get("id") or "")
+		if match is None:
+			continue
+		team, period, kind = match.group(1).upper(), match.group(2) or "game", match.group(3)
+		if period != "game" and period not in periods:
+			continue
+		if team not in teams:
+			teams.append(team)
+		tables[(team,period,kind)] = table
+	return teams, tables
+
+def _parse_table(table):
+
+	""" Extract a box score table in one pass, which gives the mapping between column labels
+	and column tags (from the header) and the data, with blank entries replaced by nans. The
+	player names are the index, with their URIs in player_uri, and players that didn't play
+	are dropped. """
+
+	columns, data = ParseTable(table,missing=np.nan,extras={"player_uri":("player","data-append-csv")})
+	players = data.pop("player",[])
+	player_uris = data.pop("player_uri",[])
+	df = pd.DataFrame(data,index=players)
+	df.rename(columns=columns,inplace=True)
+	df["player_uri"] = player_uris
+	if "reason" in df.columns:
+		df = df.loc[df.reason.isnull()].drop(columns=["reason"])
+	return df
+
+def _parse_tables(webpage,periods=()):
 
-	""" HTML processing function for the PQ webpage object. This is a refactor of the 
-	original string based processing function which uses the HTML traversing methods from PyQuery
-	to simplify the processing. """
+	""" The parsing half of _process_webpage: the title parts and each needed table parsed on
+	its own. Returns (title, home_team, away_team, date, names, frames) where names is a dict of
+	team abbreviation -> name in page order (away team first) and frames is a dict of (team,
+	period, kind) -> df. """
 
 	## Extract the webpage title, which contains the
 	## away team, home team, and date
 	title = webpage("div")("h1").eq(0).text()
 	home_team, away_team, date = _title_process(title)
 
-	## Loop over table objects in the main body of the webpage
-	## and collect information from each
-	tables = []
-	titles = []
-	for table in webpage("table").items():
-
-		## Grab the table title
-		titles.append(table("caption").text())
-
-		## Use the header to extract the mapping between
-		## column labels and column tags within the HTML. Lastly, we
-		## correct the players columns to drop the disctinction between
-		## starters and reserves.
-		header = table("thead")("tr").eq(1)("th")
-		columns = {c.attr("data-stat"):c.text() for c in header.items()}
-
-		## Extract the data from the table body, replacing
-		## blank entries with nans
-		body = table("tbody")
-		rows = {}
-		replace = {"":np.nan}
-		for row in body("tr").items():
-
-			## Skip any subheadings
-			if row.attr("class") == "thead":
-				continue
-
-			## Get the player name from the index
-			player = row("th").text()
-			
-			## And the data from the remaining columns
-			data = {entry.attr("data-stat"):replace.get(entry.text(),entry.text()) for entry in row("td").items()}
-
-			## Store the row
-			rows[player] = data
-
-		## Construct a dataframe for this table and
-		## drop players that didn't play
-		df = pd.DataFrame(rows).T
-		df.rename(columns=columns,inplace=True)
-		if "reason" in df.columns:
-			df = df.loc[df.reason.isnull()].drop(columns=["reason"])
-
-		## Store the dataframe
-		tables.append(df)
-
-	## Finally put all the dataframes together by
-	## a multistep concatenation/merger.
-	away_df = pd.concat([tables[0],tables[1].drop(columns=["MP"])],axis=1,sort=False)
-	home_df = pd.concat([tables[2],tables[3].drop(columns=["MP"])],axis=1,sort=False)
-
-	## Add the relevant columns to each df and then
-	## concatenate again and clean up.
-	away_df["Team"] = len(away_df)*[away_team]
-	home_df["Team"] = len(home_df)*[home_team]
-	df = pd.concat([away_df,home_df],axis=0)
-	df.index.rename("Player",inplace=True)
-	
-	return title, home_team, away_team, date, df
+	## Find the tables for each team, and parse them
+	teams, tables = _find_tables(webpage,periods)
+	if len(teams) != 2:
+		raise ValueError("Expected box score tables for two teams, found {}.".format(teams))
+	names = dict(zip(teams,[away_team,home_team]))
+	frames = {key:_parse_table(table) for key, table in tables.items()}
+	return title, home_team, away_team, date, names, frames
+
+def _merge_tables(names,frames,periods=()):
+
+	""" The merging half of _process_webpage: each team's basic and advanced tables side by side,
+	and then the teams stacked. Returns (df, period_dfs) for the whole game and the requested
+	periods the page has. """
+
+	def team_frame(team,period):
+
+		## The basic table, merged with the advanced
+		## one for the whole game.
+		df = frames[(team,period,"basic")]
+		if (team,period,"advanced") in frames:
+			advanced = frames[(team,period,"advanced")]
+			df = pd.concat([df,advanced.drop(columns=["MP","player_uri"])],axis=1,sort=False)
+
+		## Add the relevant columns
+		df["player_uri"] = df.pop("player_uri")
+		df["Team"] = len(df)*[names[team]]
+		df["Tm"] = len(df)*[team]
+		return df
+
+	def game_frame(period):
+		df = pd.concat([team_frame(team,period) for team in names],axis=0)
+		df.index.rename("Player",inplace=True)
+		return df
+
+	## Put the teams together for the game, and for
+	## the periods that are on the page.
+	df = game_frame("game")
+	period_dfs = {period:game_frame(period) for period in periods
+				  if all((team,period,"basic") in frames for team in names)}
+	return df, period_dfs
+
+def _process_webpage(webpage,periods=()):
+
+	""" HTML processing function for the PQ webpage object. This is a refactor of the 
+	original string based processing function which uses the HTML traversing methods from PyQuery
+	to simplify the processing.
+
+	Only the tables that are needed are parsed, i.e. each team's basic and advanced tables for the
+	whole game, plus the basic tables for periods (like "q1" or "h2", see PERIODS) if any are given.
+	Returns (title, home_team, away_team, date, df, period_dfs) where period_dfs is a dict of period
+	-> df for the requested periods the page has. """
+
+	title, home_team, away_team, date, names, frames = _parse_tables(webpage,periods)
+	df, period_dfs = _merge_tables(names,frames,periods)
+	return title, home_team, away_team, date, df, period_dfs
 
 def _type_convert(df):
 
 	""" Take the output from the webpage processing, which is a df filled with strings,
 	and type convert appropriately. """
 
-	## Type convert the numeric columns, ignoring the 
-	## columns that don't obviously convert and explicitly
-	## ignoring the minutes column, which needs some special care
-	cols = [c for c in df.columns if c != "MP"]
-	df[cols] = df[cols].apply(lambda x: pd.to_numeric(x,errors="ignore"))
-
-	## Convert the minutes played column (MP) by force
-	minutes = df.MP.apply(lambda s: s[:s.find(":")]).astype(int)
-	seconds = df.MP.apply(lambda s: s[s.find(":")+1:]).astype(int)
-	df["MP"] = minutes+seconds/60.
-
-	return df
+	## Type convert the columns according to the schema, which
+	## includes splitting the minutes played column (MP) into minutes
+	## and seconds.
+	return ConvertTypes(df,SCHEMA)
+
+def ParsePage(page,url=None,periods=()):
+
+	""" Parse the HTML text of a box score page into (title, home_team, away_team, date, df, period_dfs),
+	with the dfs type converted and dated. The output is plain data (no PyQuery objects), so this can run
+	in a separate process (see pipeline.py) and be handed to BoxScore via parsed. url is only used
+	to label the timing events (see instrument.py), and periods are as in _process_webpage. """
+
+	from pyquery import PyQuery as pq
+	start = instrument.Start()
+	title, home_team, away_team, date, names, frames = _parse_tables(pq(page,parser="html"),periods)
+	instrument.Record(start,"parse",scraper="box_score",url=url,rows=sum(len(frames[(team,"game","basic")]) for team in names))
+	start = instrument.Start()
+	df, period_dfs = _merge_tables(names,frames,periods)
+	instrument.Record(start,"merge",scraper="box_score",url=url,rows=len(df))
+	start = instrument.Start()
+	df = _type_convert(df)
+	df["date"] = date
+	for period, period_df in period_dfs.items():
+		period_dfs[period] = _type_convert(period_df)
+		period_dfs[period]["date"] = date
+	instrument.Record(start,"convert",scraper="box_score",url=url,rows=len(df))
+	return title, home_team, away_team, date, df, period_dfs
 
 
 ### Base object
@@ -114,30 +181,33 @@ class BoxScore(object):
 	""" Basic boxscore object, which encapsulates game information into a dataframe
 	and some additional attributes. """
 
-	def __init__(self, uri):
+	def __init__(self, uri, parsed=None, periods=()):
 
 		""" uri = The relative link to the boxscore HTML page, such as "201806080CLE". Over time,
-		I'll write functions to make this look up process a little easier. """
+		I'll write functions to make this look up process a little easier. 
+
+		parsed = the output of ParsePage for this box score, if the page has already been fetched
+		and parsed elsewhere (like in a pipeline.RunPipeline process pool).
+
+		periods = quarters or halves (like ["q1","q2"], see PERIODS) to also get stat lines for, which
+		end up in the periods dict (period -> df, like the main df without the advanced stats). Periods
+		the page doesn't have (older box scores have none) are left out. """
 
 		## Store the uri and the URL for reference
 		self._uri = uri
 		self.url = BOXSCORE_URL.format(self._uri)
 
-		## Retrieve the HTML text via pyquery 
-		webpage = pq(self.url)
-
-		## Process the HTML text to scrape the data and 
-		## store some useful things.
-		self.title, self.home_team, self.away_team, self.date, self.df = _process_webpage(webpage)
-
-		## Convert data types in the dataframe
-		self.df = _type_convert(self.df)
+		## Retrieve the HTML text via the shared (cached) fetch layer, and
+		## process it to scrape the data (converting data types in the dataframe
+		## and adding a date column) unless that's already been done.
+		if parsed is None:
+			parsed = ParsePage(FetchPage(self.url),url=self.url,periods=periods)
 
-		## Add a date column to the dataframe
-		self.df["date"] = len(self.df)*[self.date]
+		## Store some useful things
+		self.title, self.home_team, self.away_team, self.date, self.df, self.periods = parsed
 
 		## Compute the final score
-		self.final_score = self.df.groupby("Team")["PTS"].sum()
+		self.final_score = self.df.groupby("Team",observed=True)["PTS"].sum()
 
 	def __repr__(self):
 		return self.title
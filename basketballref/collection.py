@@ -0,0 +1,168 @@
+"""collection.py
+
+A compact store for the game-logs of many players. Instead of a dict of separate Player.df frames
+(each with its own object columns and repeated strings), the game-logs are kept in one long-format
+table indexed by date, with categorical player, team, and opponent columns. Each player's games are
+a contiguous block of rows, so a player's game-log is a slice through an offset index (a view, not a
+copy), and filters across every player are one vectorized pass over the shared columns. """
+import numpy as np
+import pandas as pd
+
+## From the bball lib
+from .player import GAMELOG_SCHEMA
+from .schema import ConvertTypes
+
+## Column types in the shared table, which also stores the repeated
+## strings (ages, results, and reasons for missed games) as categories.
+SCHEMA = dict(GAMELOG_SCHEMA,Age="category",game_result="category",reason="category")
+
+def _empty_table():
+
+	""" The shared table with no games in it, with every schema column (so selections and
+	counts work on an empty collection) and a categorical player column. """
+
+	df = pd.DataFrame(columns=[c for c in SCHEMA if c != "date"],index=pd.DatetimeIndex([],name="date"))
+	df = ConvertTypes(df,SCHEMA)
+	df.insert(0,"player",pd.Categorical([],categories=pd.Index([],dtype=object)))
+	return df
+
+class PlayerCollection(object):
+
+	""" Many players' game-logs in one long-format table, keyed by player name (or uri). """
+
+	def __init__(self,players=None):
+
+		""" players = optional dict of name -> Player.df frame, or a list of Player objects
+		(keyed by uri), to start with. """
+
+		## Frames waiting to be added, which are folded into the
+		## shared table all at once on the next access.
+		self._pending = {}
+		self._df = _empty_table()
+		self._offsets = {}
+		if players is not None:
+			self.update(players)
+
+	def __repr__(self):
+		return "Player collection ({} players, {} games)".format(len(self),len(self.df))
+
+	def __len__(self):
+		return len(self._offsets.keys() | self._pending.keys())
+
+	def __contains__(self,name):
+		return name in self._offsets or name in self._pending
+
+	def __iter__(self):
+		self._consolidate()
+		return iter(self._offsets)
+
+	def add(self,name,df):
+
+		""" Add (or replace) a player's game-log, a frame indexed by date like Player.df. """
+
+		self._pending[name] = df
+
+	def update(self,players):
+
+		""" Add many game-logs at once, from a dict of name -> df or a list of Player objects. """
+
+		if not isinstance(players,dict):
+			players = {p._uri:p.df for p in players}
+		self._pending.update(players)
+
+	def _consolidate(self):
+
+		""" Fold the pending frames into the shared table with a single concatenation, and
+		rebuild the offset index. """
+
+		if not self._pending:
+			return
+
+		## Keep the stored players that aren't being replaced, in
+		## their current order, and add the new ones after them.
+		names = [n for n in self._offsets if n not in self._pending]
+		frames = [self._df.iloc[slice(*self._offsets[n])].drop(columns=["player"]) for n in names]
+		names += list(self._pending)
+		frames += list(self._pending.values())
+		lengths = np.array([len(f) for f in frames],dtype=np.int64)
+
+		## Put it together, with the player as a categorical column (built
+		## from codes rather than repeated strings) and the shared categories
+		## for the other label columns. Players with no games are left out of
+		## the concatenation (pandas is deprecating their say in the column
+		## types), they're just zero length blocks in the offsets.
+		frames = [f for f in frames if len(f)] or [_empty_table().drop(columns=["player"])]
+		df = pd.concat(frames,axis=0,sort=False)
+		df.index.name = "date"
+		codes = np.repeat(np.arange(len(names)),lengths)
+		df = ConvertTypes(df,SCHEMA)
+		df.insert(0,"player",pd.Categorical.from_codes(codes,categories=pd.Index(names,dtype=object)))
+		self._df = df
+
+		## And the offsets of each player's block
+		ends = np.cumsum(lengths)
+		self._offsets = {n:(int(end-length),int(end)) for n, end, length in zip(names,ends,lengths)}
+		self._pending = {}
+
+	@property
+	def df(self):
+
+		""" The shared long-format table, indexed by date with a player column. """
+
+		self._consolidate()
+		return self._df
+
+	def __getitem__(self,name):
+
+		""" A player's game-log, as a slice of the shared table (treat it as read only). """
+
+		self._consolidate()
+		start, stop = self._offsets[name]
+		return self._df.iloc[start:stop]
+
+	@staticmethod
+	def _mask(df,condition):
+
+		""" condition (a query string or a boolean mask) as a numpy boolean array, where games
+		with missing values (like the counts in games a player sat out) don't match. """
+
+		mask = df.eval(condition) if isinstance(condition,str) else condition
+		if isinstance(mask,pd.Series):
+			mask = mask.fillna(False)
+		return np.asarray(mask,dtype=bool)
+
+	def select(self,condition,columns=None):
+
+		""" Games from every player matching condition, either a query string like "PTS > 40"
+		(see DataFrame.query) or a boolean mask aligned with the shared table, optionally keeping
+		only some columns (the player column is always kept). """
+
+		df = self.df
+		rows = df.loc[self._mask(df,condition)]
+		if columns is not None:
+			rows = rows[["player"]+[c for c in columns if c != "player"]]
+		return rows
+
+	def count(self,condition):
+
+		""" The number of games matching condition (as in select) for every player. """
+
+		df = self.df
+		counts = np.bincount(df["player"].cat.codes.values,weights=self._mask(df,condition).astype(np.float64),
+							 minlength=len(df["player"].cat.categories))
+		return pd.Series(counts.astype(np.int64),index=df["player"].cat.categories,name="games")
+
+	def memory_usage(self):
+
+		""" Bytes used by the shared table. """
+
+		return int(self.df.memory_usage(deep=True).sum())
+
+
+if __name__ == "__main__":
+
+	from .player import Player
+	players = PlayerCollection([Player("jamesle01",[2017,2018]),Player("hardeja01",[2017,2018])])
+	print(players)
+	print(players.select("PTS >= 40",columns=["Opp","PTS"]))
+	print(players.count("PTS >= 30"))
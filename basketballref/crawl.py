@@ -0,0 +1,339 @@
+"""crawl.py
+
+A durable crawl queue for long backfills. Every URL to fetch is a row in a SQLite job table
+with its state, the number of attempts so far, and when it can next be tried, so a crawl that's
+interrupted (or killed) picks up where it left off when it's run again. Pages are fetched through
+FetchPage into the page cache, where the scrapers then find them, so finished pages are never
+fetched twice.
+
+Failures are retried with exponential backoff. A 429 (too many requests) waits for the server's
+Retry-After and holds off the whole host in the rate limiter, without counting as an attempt, but
+consecutive 429s have a budget of their own so a URL can't be throttled forever. Missing pages
+(404s) are recorded as missing, and URLs that keep failing (or keep getting throttled) end up in
+the dead state, where they stay until retry_dead is called. """
+import os
+import time
+import random
+import sqlite3
+import datetime
+import threading
+import pandas as pd
+
+## For running the jobs
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError
+
+## From the bball lib
+from . import fetch
+from .player import GAMELOG_URL, ADV_GAMELOG_URL
+from .schedule import SCHEDULE_URL, all_months
+from .box_score import BOXSCORE_URL
+from .harvest import PlayedGames, ProgressBar
+
+## Default location of the job table
+DEFAULT_QUEUE_PATH = os.path.join(os.path.dirname(fetch.DEFAULT_CACHE_PATH),"crawl.sqlite")
+
+## Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+MISSING = "missing"
+DEAD = "dead"
+
+## Retry settings, with delays in seconds
+MAX_ATTEMPTS = 6
+MAX_THROTTLED = 10
+BACKOFF = 30.
+MAX_BACKOFF = 60*60.
+
+## How often an idle crawl checks for jobs that are due
+POLL = 1.
+
+### Retry timing
+######################################################################################
+def _retry_after(error):
+
+	""" The wait in seconds asked for by a 429's Retry-After header (either a number of
+	seconds or an HTTP date), or None if there isn't one. """
+
+	value = None if error.headers is None else error.headers.get("Retry-After")
+	if not value:
+		return None
+	try:
+		return max(0.,float(value))
+	except ValueError:
+		pass
+	try:
+		when = parsedate_to_datetime(value)
+	except (TypeError,ValueError):
+		return None
+	return max(0.,(when-datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+def _backoff(attempts,backoff=BACKOFF,max_backoff=MAX_BACKOFF):
+
+	""" Delay before the next try after attempts failures, doubling each time with some
+	jitter so that failed jobs don't all come due at once. """
+
+	return min(max_backoff,backoff*2**(attempts-1))*random.uniform(1.,1.25)
+
+### Job queue
+######################################################################################
+class CrawlQueue(object):
+
+	""" SQLite backed queue of URLs to fetch into the page cache. """
+
+	def __init__(self,path=DEFAULT_QUEUE_PATH,max_attempts=MAX_ATTEMPTS,backoff=BACKOFF,max_backoff=MAX_BACKOFF,
+				 max_throttled=MAX_THROTTLED):
+
+		""" path = location of the sqlite file, max_attempts = failures before a job is dead,
+		backoff = delay in seconds after the first failure (doubling after each one after that),
+		max_backoff = the longest delay between tries, max_throttled = 429s in a row before a
+		job is dead. """
+
+		## Store the settings
+		self.path = path
+		self.max_attempts = max_attempts
+		self.max_throttled = max_throttled
+		self.backoff = backoff
+		self.max_backoff = max_backoff
+
+		## Open the database, which is shared with the
+		## worker threads so access is guarded by a lock.
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path),exist_ok=True)
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(path,check_same_thread=False)
+		with self._lock, self._db:
+			self._db.execute("CREATE TABLE IF NOT EXISTS jobs (url TEXT PRIMARY KEY, state TEXT NOT NULL, "\
+							 "attempts INTEGER NOT NULL, next_try REAL NOT NULL, error TEXT, updated REAL NOT NULL)")
+			self._db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, next_try)")
+
+			## Queues from before 429s were capped need the
+			## count of consecutive ones.
+			columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+			if "throttled" not in columns:
+				self._db.execute("ALTER TABLE jobs ADD COLUMN throttled INTEGER NOT NULL DEFAULT 0")
+
+			## Jobs that were running when a previous crawl died
+			## never finished, so they go back in the queue.
+			self._db.execute("UPDATE jobs SET state = ? WHERE state = ?",(PENDING,RUNNING))
+
+	def __repr__(self):
+		counts = self.counts()
+		return "Crawl queue at {} ({})".format(self.path,", ".join("{} {}".format(n,s) for s, n in counts.items()))
+
+	def __len__(self):
+		with self._lock:
+			return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+	def __contains__(self,url):
+		with self._lock:
+			return self._db.execute("SELECT 1 FROM jobs WHERE url = ?",(url,)).fetchone() is not None
+
+	def add(self,urls):
+
+		""" Queue urls (ones already in the queue, in any state, are left alone). Returns the
+		number of new jobs. """
+
+		now = time.time()
+		with self._lock, self._db:
+			before = self._db.total_changes
+			self._db.executemany("INSERT OR IGNORE INTO jobs (url, state, attempts, next_try, error, updated) "\
+								 "VALUES (?,?,0,?,NULL,?)",
+								 [(url,PENDING,now,now) for url in urls])
+			return self._db.total_changes-before
+
+	def counts(self):
+
+		""" Number of jobs in each state. """
+
+		with self._lock:
+			rows = dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+		return {state:rows.get(state,0) for state in (PENDING,RUNNING,DONE,MISSING,DEAD)}
+
+	def jobs(self,state=None):
+
+		""" The job table (optionally only jobs in state) as a dataframe. """
+
+		query = "SELECT * FROM jobs" + ("" if state is None else " WHERE state = ?")
+		with self._lock:
+			df = pd.read_sql_query(query,self._db,params=() if state is None else (state,))
+		for column in ("next_try","updated"):
+			df[column] = pd.to_datetime(df[column],unit="s")
+		return df
+
+	def retry_dead(self):
+
+		""" Put dead jobs back in the queue with a fresh set of attempts. Returns how many. """
+
+		with self._lock, self._db:
+			return self._db.execute("UPDATE jobs SET state = ?, attempts = 0, throttled = 0, next_try = ? WHERE state = ?",
+									(PENDING,time.time(),DEAD)).rowcount
+
+	def _claim(self,n):
+
+		""" Mark up to n jobs that are due as running, and return their urls. """
+
+		if n <= 0:
+			return []
+		now = time.time()
+		with self._lock, self._db:
+			urls = [row[0] for row in self._db.execute("SELECT url FROM jobs WHERE state = ? AND next_try <= ? "\
+													   "ORDER BY next_try LIMIT ?",(PENDING,now,n))]
+			self._db.executemany("UPDATE jobs SET state = ?, updated = ? WHERE url = ?",[(RUNNING,now,url) for url in urls])
+		return urls
+
+	def _next_due(self):
+
+		""" Seconds until the next pending job is due, or None if nothing's pending. """
+
+		with self._lock:
+			next_try = self._db.execute("SELECT MIN(next_try) FROM jobs WHERE state = ?",(PENDING,)).fetchone()[0]
+		return None if next_try is None else max(0.,next_try-time.time())
+
+	def _finish(self,url,error=None):
+
+		""" Record the outcome of a job: done, missing (404s), back in the queue with a
+		delay, or dead once it's out of attempts (or throttled too many times in a row).
+		Returns the new state. """
+
+		now = time.time()
+		with self._lock:
+			attempts, throttled = self._db.execute("SELECT attempts, throttled FROM jobs WHERE url = ?",(url,)).fetchone()
+		if not (isinstance(error,HTTPError) and error.code == 429):
+			throttled = 0
+		if error is None:
+			state, next_try, message = DONE, now, None
+		elif isinstance(error,HTTPError) and error.code in (404,410):
+			state, next_try, message = MISSING, now, str(error)
+			attempts += 1
+		elif isinstance(error,HTTPError) and error.code == 429:
+
+			## Throttling isn't the page's fault, so it doesn't use up
+			## an attempt, but the whole host waits it out. A server that
+			## never stops throttling a url still kills the job eventually.
+			throttled += 1
+			message = str(error)
+			if throttled > self.max_throttled:
+				state, next_try = DEAD, now
+				message += " ({} times in a row)".format(throttled)
+			else:
+				delay = _retry_after(error)
+				if delay is None:
+					delay = _backoff(throttled,self.backoff,self.max_backoff)
+				fetch.GetRateLimiter().pause(url,delay)
+				state, next_try = PENDING, now+delay
+		else:
+			attempts += 1
+			message = "{}: {}".format(type(error).__name__,error)
+			if attempts >= self.max_attempts:
+				state, next_try = DEAD, now
+			else:
+				state, next_try = PENDING, now+_backoff(attempts,self.backoff,self.max_backoff)
+		with self._lock, self._db:
+			self._db.execute("UPDATE jobs SET state = ?, attempts = ?, throttled = ?, next_try = ?, error = ?, updated = ? "\
+							 "WHERE url = ?",(state,attempts,throttled,next_try,message,now,url))
+		return state
+
+	def run(self,workers=8,progress=True,until=None):
+
+		""" Work through the queue until every job is done, missing, or dead, waiting out any
+		backoff delays along the way. Returns counts().
+
+		workers: number of jobs in flight at once (the rate limiter still governs the request rate).
+		progress: True for a tqdm progress bar (if tqdm is installed), or a callable taking (done, total).
+		until: optional time.time() deadline, after which no new jobs are started (jobs still due
+			stay in the queue for the next run). """
+
+		if fetch.GetCache() is None:
+			raise ValueError("Crawling needs the page cache, see fetch.ConfigureCache.")
+
+		update, close = ProgressBar(self.counts()[PENDING],progress)
+		running = {}
+		pool = ThreadPoolExecutor(max_workers=workers)
+		try:
+			while True:
+
+				## Top up the jobs in flight
+				if until is None or time.time() < until:
+					for url in self._claim(workers-len(running)):
+						running[pool.submit(fetch.FetchPage,url)] = url
+
+				## With nothing in flight, wait for the next job to come
+				## due, or stop if there aren't any left.
+				if not running:
+					due = self._next_due()
+					if due is None or (until is not None and time.time()+due >= until):
+						break
+					time.sleep(min(due,POLL))
+					continue
+
+				## Record whatever finishes
+				finished, _ = wait(running,timeout=POLL,return_when=FIRST_COMPLETED)
+				for future in finished:
+					if self._finish(running.pop(future),future.exception()) != PENDING:
+						update()
+
+		finally:
+
+			## Anything still unfinished (e.g. after a keyboard interrupt)
+			## goes back in the queue.
+			pool.shutdown(wait=True,cancel_futures=True)
+			with self._lock, self._db:
+				self._db.executemany("UPDATE jobs SET state = ? WHERE url = ? AND state = ?",
+									 [(PENDING,url,RUNNING) for url in running.values()])
+			close()
+		return self.counts()
+
+	def close(self):
+		self._db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		self.close()
+
+### URL lists
+######################################################################################
+def ScheduleUrls(seasons,months=all_months):
+
+	""" Monthly schedule page URLs for seasons (months without games come back missing). """
+
+	return [SCHEDULE_URL.format(season,month) for season in seasons for month in months]
+
+def BoxScoreUrls(schedule):
+
+	""" Box score URLs for every played game in a schedule (anything harvest accepts: a season,
+	a SeasonSchedule, or a schedule dataframe). """
+
+	return [BOXSCORE_URL.format(uri) for uri in PlayedGames(schedule)]
+
+def GamelogUrls(uri,seasons,advanced=True):
+
+	""" Gamelog page URLs for a player's seasons, as used by Player(uri, seasons, advanced). """
+
+	base_urls = [GAMELOG_URL,ADV_GAMELOG_URL] if advanced else [GAMELOG_URL]
+	return [base_url.format(uri,season) for season in seasons for base_url in base_urls]
+
+def CrawlSeasons(seasons,path=DEFAULT_QUEUE_PATH,workers=8,progress=True):
+
+	""" Backfill the schedules and box scores for seasons into the page cache. The schedules
+	are crawled first, then the box scores of their played games are queued and crawled. Safe
+	to rerun after an interruption. Returns the queue's counts(). """
+
+	with CrawlQueue(path) as queue:
+		queue.add(ScheduleUrls(seasons))
+		queue.run(workers=workers,progress=progress)
+		for season in seasons:
+			queue.add(BoxScoreUrls(season))
+		return queue.run(workers=workers,progress=progress)
+
+
+if __name__ == "__main__":
+
+	print(CrawlSeasons([2017,2018]))
+	with CrawlQueue() as queue:
+		print(queue)
+		print(queue.jobs(DEAD))
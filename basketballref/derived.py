@@ -0,0 +1,213 @@
+"""derived.py
+
+Derived stats (rolling averages, per-36 rates, true shooting, usage, and season aggregates) for
+many players at once. Everything works on a long-format table, one row per player-game with a player
+key column and a date column, which is what a season harvest or warehouse read gives for box scores,
+and what StackGamelogs builds from a collection of Player.df frames. Each computation is a single
+grouped or cumulative-sum pass over the whole table rather than a loop over players.
+
+Results are cached by a fingerprint of the input table (and the arguments), so recomputing a
+leaderboard on unchanged data is a dictionary lookup. """
+import hashlib
+import collections
+import numpy as np
+import pandas as pd
+
+## From the bball lib
+from .fetch import SeasonOf
+
+## Counting stats, which are summed over games and
+## turned into per-36 minute rates.
+COUNT_STATS = ["FG","FGA","3P","3PA","FT","FTA","ORB","DRB","TRB","AST","STL","BLK","TOV","PF","PTS"]
+
+## Size of the results cache
+CACHE_SIZE = 64
+_cache = collections.OrderedDict()
+
+### Fingerprint cache
+######################################################################################
+def Fingerprint(df):
+
+	""" A hash of df's contents (values, index, and column labels), computed with pandas'
+	vectorized row hashing. """
+
+	digest = hashlib.sha1(pd.util.hash_pandas_object(df,index=True).values.tobytes())
+	digest.update(repr(list(df.columns)).encode("utf-8"))
+	return digest.hexdigest()
+
+def _cached(func):
+
+	""" Memoize func(df, *args, **kwargs) on the fingerprint of df and the arguments,
+	keeping the CACHE_SIZE most recent results. Results are shared, so treat them as
+	read only (or copy them). """
+
+	def wrapper(df,*args,**kwargs):
+		key = (func.__name__,Fingerprint(df),repr(args),repr(sorted(kwargs.items())))
+		if key in _cache:
+			_cache.move_to_end(key)
+			return _cache[key]
+		result = func(df,*args,**kwargs)
+		_cache[key] = result
+		if len(_cache) > CACHE_SIZE:
+			_cache.popitem(last=False)
+		return result
+	wrapper.__name__ = func.__name__
+	wrapper.__doc__ = func.__doc__
+	return wrapper
+
+def ClearCache():
+	_cache.clear()
+
+### Input preparation
+######################################################################################
+def StackGamelogs(frames,key="player"):
+
+	""" Stack a collection of Player.df frames (a dict of name or uri -> df, or a list of
+	Player objects) into one long-format table with key and date columns, sorted by player
+	and date. The key column is categorical. """
+
+	if not isinstance(frames,dict):
+		frames = {p._uri:p.df for p in frames}
+	names = list(frames)
+	lengths = [len(frames[n]) for n in names]
+
+	## Players with no games (e.g. none in the requested seasons) are left
+	## out of the concatenation but keep their category, with the key built
+	## from codes so the categories don't depend on which players have rows.
+	parts = [frames[n].reset_index() for n in names if len(frames[n])] or [frames[n].reset_index() for n in names[:1]]
+	df = pd.concat(parts,axis=0,ignore_index=True,sort=False)
+	codes = np.repeat(np.arange(len(names)),lengths)
+	df[key] = pd.Categorical.from_codes(codes,categories=pd.Index(names,dtype=object))
+	return df.sort_values([key,"date"],kind="stable").reset_index(drop=True)
+
+def _played(df):
+
+	""" Rows for games the player actually played in (gamelogs and box scores both
+	have rows for games where a player was inactive or didn't play). """
+
+	if "MP" not in df.columns:
+		return df
+	return df.loc[df["MP"].fillna(0) > 0]
+
+### Per-game rates
+######################################################################################
+def _rates(df):
+
+	""" Shooting and per-36 rates from count columns, which works the same on
+	single games and on totals. """
+
+	out = pd.DataFrame(index=df.index)
+	shots = 2.*(df["FGA"]+0.44*df["FTA"])
+	out["TS%"] = (df["PTS"]/shots.where(shots > 0)).astype(np.float32)
+	out["eFG%"] = ((df["FG"]+0.5*df["3P"])/df["FGA"].where(df["FGA"] > 0)).astype(np.float32)
+	minutes = df["MP"].where(df["MP"] > 0)
+	for stat in COUNT_STATS:
+		if stat in df.columns:
+			out[stat+"/36"] = (36.*df[stat]/minutes).astype(np.float32)
+	return out
+
+def _usage(df,key):
+
+	""" Usage percentage from team totals, which are only available in box score
+	tables (with uri and Team columns). Gamelogs carry USG% from the advanced page. """
+
+	if "USG%" in df.columns and not {"uri","Team"}.issubset(df.columns):
+		return df["USG%"].astype(np.float32)
+	if not {"uri","Team"}.issubset(df.columns):
+		return pd.Series(np.nan,index=df.index,dtype=np.float32)
+	possessions = df["FGA"]+0.44*df["FTA"]+df["TOV"]
+	team = df.groupby(["uri","Team"],observed=True)
+	team_possessions = team["FGA"].transform("sum")+0.44*team["FTA"].transform("sum")+team["TOV"].transform("sum")
+	team_minutes = team["MP"].transform("sum")
+	usage = 100.*possessions*(team_minutes/5.)/(df["MP"].where(df["MP"] > 0)*team_possessions)
+	return usage.astype(np.float32)
+
+@_cached
+def GameRates(df,key="player"):
+
+	""" Per-game TS%, eFG%, USG%, and per-36 rates for every row of a long-format table,
+	returned as a frame aligned with df. """
+
+	out = _rates(df)
+	out["USG%"] = _usage(df,key)
+	return out
+
+### Rolling windows
+######################################################################################
+@_cached
+def Rolling(df,columns=("PTS","AST","TRB","GmSc"),window=10,key="player",min_periods=1):
+
+	""" Rolling means of columns over each player's last window games (in date order), for
+	every player in a single cumulative-sum pass. Missing values (games a player sat out)
+	are skipped, i.e. the mean is over the games with a value in the window. Returns a frame
+	aligned with df. """
+
+	## Sort by player and date, and find where each
+	## player's games start.
+	codes = pd.factorize(df[key])[0]
+	order = np.lexsort((df["date"].values,codes))
+	codes = codes[order]
+	first = np.concatenate([[True],codes[1:] != codes[:-1]])
+	start = np.maximum.accumulate(np.where(first,np.arange(len(order)),0))
+
+	out = {}
+	for column in columns:
+		values = df[column].values[order].astype(np.float64)
+		present = ~np.isnan(values)
+
+		## Cumulative sums with a leading zero, so the sum over
+		## rows [a, b) is cs[b]-cs[a].
+		sums = np.concatenate([[0.],np.cumsum(np.where(present,values,0.))])
+		counts = np.concatenate([[0],np.cumsum(present)])
+		end = np.arange(1,len(order)+1)
+		begin = np.maximum(end-window,start)
+		total = sums[end]-sums[begin]
+		count = counts[end]-counts[begin]
+
+		mean = np.full(len(order),np.nan)
+		enough = count >= min_periods
+		mean[enough] = total[enough]/count[enough]
+		result = np.empty(len(order))
+		result[order] = mean
+		out["{}_{}".format(column,window)] = result.astype(np.float32)
+
+	return pd.DataFrame(out,index=df.index)
+
+### Season aggregates
+######################################################################################
+@_cached
+def SeasonTotals(df,key="player"):
+
+	""" Season aggregates for every player: games played, total minutes and counting stats,
+	and the rates (TS%, eFG%, per-36) recomputed from the totals. Indexed by (key, season). """
+
+	played = _played(df)
+	stats = ["MP"]+[s for s in COUNT_STATS if s in df.columns]
+	season = SeasonOf(played["date"]).rename("season")
+	groups = played.groupby([played[key],season],observed=True)
+	totals = groups[stats].sum()
+	totals.insert(0,"G",groups.size().astype(np.int16))
+	totals = totals.join(_rates(totals))
+	for stat in ("PTS","AST","TRB"):
+		if stat in totals.columns:
+			totals[stat+"/G"] = (totals[stat]/totals["G"]).astype(np.float32)
+	return totals
+
+def Leaderboard(df,stat,key="player",min_games=20,n=25,season=None):
+
+	""" The top n player-seasons by stat (a column of SeasonTotals, like "PTS/G" or "TS%"),
+	among players with at least min_games games, optionally for a single season. """
+
+	totals = SeasonTotals(df,key=key)
+	if season is not None:
+		totals = totals.xs(season,level="season",drop_level=False)
+	totals = totals.loc[totals["G"] >= min_games]
+	return totals.sort_values(stat,ascending=False).head(n)
+
+
+if __name__ == "__main__":
+
+	from .harvest import HarvestBoxScores
+	df = HarvestBoxScores(2018)
+	print(Leaderboard(df,"PTS/G",key="Player"))
+	print(Leaderboard(df,"TS%",key="Player",min_games=50))
@@ -0,0 +1,170 @@
+"""directory.py
+
+A persistent, indexed version of the player list from GetPlayerList. The list is fetched once
+(with the letter pages fetched concurrently), saved to disk, and only refetched when asked.
+Lookups go through hashed indexes by uri and by normalized name (lower case, accents folded,
+punctuation dropped), with prefix and fuzzy matching on top, so resolving names to
+(uri, first_year, last_year) doesn't require scraping anything. """
+import os
+import re
+import bisect
+import difflib
+import unicodedata
+import pandas as pd
+
+## From the bball lib
+from .fetch import DEFAULT_CACHE_PATH
+from .player import PLAYER_LIST_SCHEMA, GetPlayerList
+from .schema import ConvertTypes
+
+## Default location for the saved directory, next
+## to the page cache.
+DEFAULT_DIRECTORY_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH),"players.pkl")
+
+## All the player list pages (there's no x page)
+ALL_LETTERS = "abcdefghijklmnopqrstuvwyz"
+
+### Name normalization
+######################################################################################
+punctuation_re = re.compile(r"[^\w\s]")
+
+def NormalizeName(name):
+
+	""" Normalize a player name for matching, so that "Nikola Jokić", "nikola jokic", and
+	"Nikola Jokic " all map to "nikola jokic". Hyphens become spaces and other punctuation
+	(periods, apostrophes) is dropped. """
+
+	name = unicodedata.normalize("NFKD",name)
+	name = "".join(c for c in name if not unicodedata.combining(c))
+	name = punctuation_re.sub("",name.replace("-"," "))
+	return " ".join(name.casefold().split())
+
+### Directory object
+######################################################################################
+class PlayerDirectory(object):
+
+	""" Indexed player list, which is loaded from disk if possible and fetched otherwise. """
+
+	def __init__(self,path=DEFAULT_DIRECTORY_PATH,letters=ALL_LETTERS,workers=8,refresh=False):
+
+		""" path = where the directory is saved (None to keep it in memory only), letters = the player
+		list pages to include, workers = threads for fetching letter pages, refresh = True to
+		refetch everything even if there's a saved copy. """
+
+		## Store the settings
+		self.path = path
+		self.workers = workers
+
+		## Load what's saved, if anything
+		self.df = pd.DataFrame([],columns=["uri","player","first_year","last_year"])
+		self.letters = ""
+		if path is not None and os.path.exists(path) and not refresh:
+			saved = pd.read_pickle(path)
+			self.df, self.letters = saved["df"], saved["letters"]
+
+		## Fetch any letters that are missing
+		missing = "".join(l for l in letters if l not in self.letters)
+		if missing:
+			self.refresh(missing)
+		else:
+			self._index()
+
+	def __repr__(self):
+		return "Player directory ({} players)".format(len(self.df))
+
+	def __len__(self):
+		return len(self.df)
+
+	def refresh(self,letters=ALL_LETTERS):
+
+		""" Refetch the player list pages for letters (concurrently), replacing those
+		players in the directory, and save the result. """
+
+		## Get the new pages and swap out those letters
+		new = GetPlayerList(letters,workers=self.workers)
+		keep = self.df.loc[~self.df["uri"].str[0].isin(list(letters))]
+		if len(keep):
+			new = pd.concat([keep,new],axis=0,ignore_index=True,sort=False)
+		self.df = ConvertTypes(new.reset_index(drop=True),PLAYER_LIST_SCHEMA)
+		self.letters = "".join(sorted(set(self.letters) | set(letters)))
+
+		## Save and rebuild the indexes
+		if self.path is not None:
+			if os.path.dirname(self.path):
+				os.makedirs(os.path.dirname(self.path),exist_ok=True)
+			pd.to_pickle({"df":self.df,"letters":self.letters},self.path)
+		self._index()
+
+	def _index(self):
+
+		""" Build the lookup structures: records (tuples of uri, first_year, last_year, name),
+		hashed indexes by uri and normalized name, and a sorted name list for prefix searches. """
+
+		self._records = list(zip(self.df["uri"],self.df["first_year"].astype(int),
+								 self.df["last_year"].astype(int),self.df["player"]))
+		self._by_uri = {}
+		self._by_name = {}
+		for i, record in enumerate(self._records):
+			self._by_uri[record[0]] = i
+			self._by_name.setdefault(NormalizeName(record[3]),[]).append(i)
+		self._names = sorted(self._by_name)
+
+	### Lookups
+	######################################################################################
+	def get(self,uri):
+
+		""" The (uri, first_year, last_year) record for uri, or None. """
+
+		i = self._by_uri.get(uri)
+		return None if i is None else self._records[i][:3]
+
+	def find(self,name):
+
+		""" All (uri, first_year, last_year) records for players with exactly this (normalized)
+		name. There can be more than one, e.g. for fathers and sons. """
+
+		return [self._records[i][:3] for i in self._by_name.get(NormalizeName(name),[])]
+
+	def prefix(self,text,limit=10):
+
+		""" Player names starting with text (after normalization), up to limit of them. """
+
+		text = NormalizeName(text)
+		start = bisect.bisect_left(self._names,text)
+		names = []
+		for name in self._names[start:start+limit]:
+			if not name.startswith(text):
+				break
+			names.extend(self._records[i][3] for i in self._by_name[name])
+		return names[:limit]
+
+	def fuzzy(self,name,limit=5,cutoff=0.8):
+
+		""" Player names that are close to name (for typos and nicknames with an extra
+		letter, etc.), best matches first. """
+
+		matches = difflib.get_close_matches(NormalizeName(name),self._names,n=limit,cutoff=cutoff)
+		return [self._records[i][3] for match in matches for i in self._by_name[match]][:limit]
+
+	def resolve(self,names,fuzzy=True):
+
+		""" Map each name in names to a (uri, first_year, last_year) record. Exact matches are used when
+		they exist (the most recent career if the name is shared), falling back to the closest fuzzy
+		match if fuzzy = True. Names that can't be resolved map to None. """
+
+		resolved = {}
+		for name in names:
+			records = self.find(name)
+			if not records and fuzzy:
+				close = self.fuzzy(name,limit=1)
+				records = self.find(close[0]) if close else []
+			resolved[name] = max(records,key=lambda r: r[2]) if records else None
+		return resolved
+
+
+if __name__ == "__main__":
+
+	directory = PlayerDirectory()
+	print(directory)
+	print(directory.resolve(["Michael Jordan","James Harden","Nikola Jokic","Giannis Antetokounmpo"]))
+	print(directory.prefix("Steph"))
@@ -0,0 +1,540 @@
+"""fetch.py
+
+Shared fetch layer for all of the scrapers in the package. Every page request
+goes through FetchPage, which is backed by a persistent on-disk cache keyed by URL.
+
+Pages that can't change anymore (final box scores and anything from a past season)
+never expire, pages from the current season are refetched after a configurable TTL,
+and the cache evicts the least recently used pages to stay under a byte budget.
+
+Network requests go through a pool of keep-alive connections per host, ask for gzip
+compressed pages, and revalidate expired cached copies with conditional requests (so an
+unchanged page costs a 304 rather than a download). They're throttled by a per-host rate
+limiter, which is what makes it safe to fetch many pages at once with FetchPages. The
+network itself can be swapped out for another transport with SetTransport. """
+import os
+import re
+import time
+import zlib
+import sqlite3
+import datetime
+import threading
+import collections
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+## For the network requests
+import http.client
+from urllib.parse import urlsplit, urljoin
+from urllib.error import HTTPError
+
+## Timing hooks
+from . import instrument
+
+## Default cache settings, which can be changed via ConfigureCache
+DEFAULT_CACHE_PATH = os.environ.get("BASKETBALLREF_CACHE",
+					os.path.join(os.path.expanduser("~"),".cache","basketballref","pages.sqlite"))
+DEFAULT_TTL = 6*60*60
+DEFAULT_MAX_BYTES = 1024**3
+
+## Request settings
+USER_AGENT = "Mozilla/5.0 (compatible; basketballref)"
+TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+## Default rate limits, per host. basketball-reference.com asks bots to
+## stay under 20 requests a minute.
+DEFAULT_RATE = 20/60.
+DEFAULT_MAX_IN_FLIGHT = 4
+
+### URL classification
+######################################################################################
+## Season embedded in gamelog, roster, and schedule URLs (see the URL
+## templates in the individual modules).
+season_re = re.compile(r"(?:/gamelog(?:-advanced)?/|/teams/\w+/|/NBA_)(\d{4})")
+
+def SeasonOf(dates):
+
+	""" The season (i.e. the year of the january in the season) for a date, or for a series
+	(or other array-like) of dates, which comes back as an int16 series. """
+
+	if isinstance(dates,datetime.date):
+		return dates.year + (dates.month >= 7)
+	import pandas as pd
+	dates = pd.to_datetime(dates if isinstance(dates,pd.Series) else pd.Series(dates))
+	return (dates.dt.year + (dates.dt.month >= 7)).astype("int16")
+
+def CurrentSeason(today=None):
+
+	""" The season that's currently in progress, or the upcoming one during
+	the summer. """
+
+	return SeasonOf(today or datetime.date.today())
+
+def _is_permanent(url):
+
+	""" Decide if the page at url can never change, which is true for box scores
+	(we only ask for those once the game is over) and for pages tied to a past season. """
+
+	if "/boxscores/" in url:
+		return True
+	match = season_re.search(url)
+	if match is None:
+		return False
+	return int(match.group(1)) < CurrentSeason()
+
+### Persistent cache
+######################################################################################
+class PageCache(object):
+
+	""" SQLite backed page cache, keyed by URL. Page bodies are stored zlib compressed,
+	and the compressed size is what counts towards the max_bytes budget. The ETag and
+	Last-Modified headers the page came with are kept for revalidating it once it expires. """
+
+	def __init__(self,path=DEFAULT_CACHE_PATH,ttl=DEFAULT_TTL,max_bytes=DEFAULT_MAX_BYTES):
+
+		""" path = location of the sqlite file, ttl = lifetime in seconds of pages from the
+		current season, max_bytes = size budget for the stored pages. """
+
+		## Store the settings
+		self.path = path
+		self.ttl = ttl
+		self.max_bytes = max_bytes
+
+		## Open the database, which is shared across threads
+		## so access is guarded by a lock.
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path),exist_ok=True)
+		self._lock = threading.Lock()
+		self._db = sqlite3.connect(path,check_same_thread=False)
+		with self._lock, self._db:
+			self._db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, body BLOB NOT NULL, "\
+							 "size INTEGER NOT NULL, fetched REAL NOT NULL, accessed REAL NOT NULL, "\
+							 "permanent INTEGER NOT NULL)")
+			self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed)")
+
+			## Caches from before validators were stored
+			## need the extra columns.
+			columns = [row[1] for row in self._db.execute("PRAGMA table_info(pages)")]
+			for column in ("etag","last_modified"):
+				if column not in columns:
+					self._db.execute("ALTER TABLE pages ADD COLUMN {} TEXT".format(column))
+
+	def get(self,url):
+
+		""" Return the cached page text for url, or None if it's missing or expired. """
+
+		now = time.time()
+		with self._lock, self._db:
+			row = self._db.execute("SELECT body, fetched, permanent FROM pages WHERE url = ?",(url,)).fetchone()
+			if row is None:
+				return None
+			body, fetched, permanent = row
+			if not permanent and now - fetched > self.ttl:
+				return None
+			self._db.execute("UPDATE pages SET accessed = ? WHERE url = ?",(now,url))
+		return zlib.decompress(body).decode("utf-8")
+
+	def stored(self,url):
+
+		""" The (text, etag, last_modified) stored for url whether or not it's expired,
+		or None if it's missing. This is what conditional requests revalidate. """
+
+		with self._lock:
+			row = self._db.execute("SELECT body, etag, last_modified FROM pages WHERE url = ?",(url,)).fetchone()
+		if row is None:
+			return None
+		return zlib.decompress(row[0]).decode("utf-8"), row[1], row[2]
+
+	def put(self,url,text,permanent=None,etag=None,last_modified=None):
+
+		""" Store the page text for url (with its validators, if any), evicting least
+		recently used pages if that puts the cache over budget. """
+
+		if permanent is None:
+			permanent = _is_permanent(url)
+		body = zlib.compress(text.encode("utf-8"))
+		now = time.time()
+		with self._lock, self._db:
+			self._db.execute("INSERT OR REPLACE INTO pages (url, body, size, fetched, accessed, permanent, etag, last_modified) "\
+							 "VALUES (?,?,?,?,?,?,?,?)",(url,body,len(body),now,now,int(permanent),etag,last_modified))
+			self._evict()
+
+	def touch(self,url):
+
+		""" Mark the stored copy of url as freshly fetched, for pages that were
+		revalidated rather than downloaded again. """
+
+		now = time.time()
+		with self._lock, self._db:
+			self._db.execute("UPDATE pages SET fetched = ?, accessed = ? WHERE url = ?",(now,now,url))
+
+	def _evict(self):
+
+		""" Drop least recently used pages until the total size is under max_bytes. Must
+		be called with the lock held. """
+
+		total = self._db.execute("SELECT COALESCE(SUM(size),0) FROM pages").fetchone()[0]
+		if total <= self.max_bytes:
+			return
+		to_drop = []
+		for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY accessed"):
+			if total <= self.max_bytes:
+				break
+			to_drop.append((url,))
+			total -= size
+		self._db.executemany("DELETE FROM pages WHERE url = ?",to_drop)
+
+	def clear(self):
+		with self._lock, self._db:
+			self._db.execute("DELETE FROM pages")
+
+	def size(self):
+
+		""" Total stored (compressed) bytes. """
+
+		with self._lock:
+			return self._db.execute("SELECT COALESCE(SUM(size),0) FROM pages").fetchone()[0]
+
+	def __len__(self):
+		with self._lock:
+			return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+	def __contains__(self,url):
+		with self._lock:
+			return self._db.execute("SELECT 1 FROM pages WHERE url = ?",(url,)).fetchone() is not None
+
+## The module level cache, created on first use so that just importing
+## the package never touches the disk.
+_cache = None
+_cache_lock = threading.Lock()
+_cache_settings = {"path":DEFAULT_CACHE_PATH,"ttl":DEFAULT_TTL,"max_bytes":DEFAULT_MAX_BYTES}
+
+def ConfigureCache(path=DEFAULT_CACHE_PATH,ttl=DEFAULT_TTL,max_bytes=DEFAULT_MAX_BYTES):
+
+	""" Change the cache used by every scraper. path=None turns caching off entirely. """
+
+	global _cache
+	_cache = None
+	_cache_settings.update(path=path,ttl=ttl,max_bytes=max_bytes)
+
+def GetCache():
+
+	""" The PageCache shared by the scrapers (or None if caching is off). """
+
+	global _cache
+	with _cache_lock:
+		if _cache is None and _cache_settings["path"] is not None:
+			_cache = PageCache(**_cache_settings)
+		return _cache
+
+### Rate limiting
+######################################################################################
+class RateLimiter(object):
+
+	""" Per-host limiter, which spaces out the start of requests so there are at most
+	rate of them per second, and caps the number of requests in flight at once. """
+
+	def __init__(self,rate=DEFAULT_RATE,max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+
+		""" rate = requests per second per host (None for no limit), max_in_flight = concurrent
+		requests per host. """
+
+		self.rate = rate
+		self.max_in_flight = max_in_flight
+		self._lock = threading.Lock()
+		self._hosts = {}
+
+	def _host_state(self,host):
+		with self._lock:
+			if host not in self._hosts:
+				self._hosts[host] = [threading.BoundedSemaphore(self.max_in_flight),0.]
+			return self._hosts[host]
+
+	@contextmanager
+	def limit(self,url):
+
+		""" Context manager that blocks until a request to url is allowed to start. """
+
+		state = self._host_state(urlsplit(url).netloc)
+		state[0].acquire()
+		try:
+
+			## Reserve the next start slot for this host
+			## and wait for it outside of the lock (which also
+			## covers any pause without a rate limit).
+			with self._lock:
+				now = time.monotonic()
+				start = max(now,state[1])
+				if self.rate:
+					state[1] = start + 1./self.rate
+			time.sleep(start-now)
+			yield
+		finally:
+			state[0].release()
+
+	def pause(self,url,seconds):
+
+		""" Hold off every request to url's host for seconds (e.g. when the site says
+		it's being hit too hard). """
+
+		state = self._host_state(urlsplit(url).netloc)
+		with self._lock:
+			state[1] = max(state[1],time.monotonic()+seconds)
+
+## The limiter shared by all network requests
+_limiter = RateLimiter()
+
+def ConfigureRateLimit(rate=DEFAULT_RATE,max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+
+	""" Change the per-host requests per second (rate) and concurrent request cap
+	(max_in_flight) for every scraper. """
+
+	global _limiter
+	_limiter = RateLimiter(rate,max_in_flight)
+
+def GetRateLimiter():
+	return _limiter
+
+### Network transport
+######################################################################################
+class Page(str):
+
+	""" Page text from a transport, with the response's validators attached, and whether
+	the response was a 304 (i.e. the text is the stored copy). """
+
+	def __new__(cls,text,etag=None,last_modified=None,not_modified=False):
+		page = str.__new__(cls,text)
+		page.etag = etag
+		page.last_modified = last_modified
+		page.not_modified = not_modified
+		return page
+
+class PooledTransport(object):
+
+	""" HTTP transport with a pool of keep-alive connections per host, gzip compressed
+	transfers, and conditional requests. Requests are subject to the shared rate limiter,
+	and HTTP errors are raised as urllib HTTPErrors (so 404s look the same as they always
+	have to the scrapers). """
+
+	## Tells FetchPage to pass the stored copy along
+	## for conditional requests.
+	conditional = True
+
+	def __init__(self,max_idle=DEFAULT_MAX_IN_FLIGHT,timeout=TIMEOUT):
+
+		""" max_idle = idle connections kept open per host, timeout = socket timeout in seconds. """
+
+		self.max_idle = max_idle
+		self.timeout = timeout
+		self._lock = threading.Lock()
+		self._idle = {}
+
+	def _connection(self,key):
+
+		""" An idle connection to (scheme, host) if there is one, otherwise a new
+		one, along with whether it was reused. """
+
+		with self._lock:
+			if self._idle.get(key):
+				return self._idle[key].pop(), True
+		scheme, host = key
+		cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+		return cls(host,timeout=self.timeout), False
+
+	def _release(self,key,connection):
+		with self._lock:
+			idle = self._idle.setdefault(key,[])
+			if len(idle) < self.max_idle:
+				idle.append(connection)
+				return
+		connection.close()
+
+	def _request(self,url,headers):
+
+		""" Send a GET for url on a pooled connection, returning the response and its body. A
+		reused connection that turns out to have been closed by the server is retried once on a
+		new connection. """
+
+		parts = urlsplit(url)
+		key = (parts.scheme,parts.netloc)
+		path = (parts.path or "/")+("?"+parts.query if parts.query else "")
+		while True:
+			connection, reused = self._connection(key)
+			try:
+				connection.request("GET",path,headers=headers)
+				response = connection.getresponse()
+				body = response.read()
+			except (http.client.HTTPException,OSError):
+				connection.close()
+				if reused:
+					continue
+				raise
+			if response.will_close:
+				connection.close()
+			else:
+				self._release(key,connection)
+			return response, body
+
+	def __call__(self,url,stored=None):
+
+		""" Get the page at url as a Page. stored = the (text, etag, last_modified) of a stored copy
+		to revalidate, which is returned (as a Page with not_modified set) if the server says it
+		hasn't changed. """
+
+		headers = {"User-Agent":USER_AGENT,"Accept-Encoding":"gzip","Connection":"keep-alive"}
+		if stored is not None:
+			if stored[1]:
+				headers["If-None-Match"] = stored[1]
+			if stored[2]:
+				headers["If-Modified-Since"] = stored[2]
+
+		## Make the request, following any redirects
+		for _ in range(MAX_REDIRECTS+1):
+			with _limiter.limit(url):
+				response, body = self._request(url,headers)
+			if response.status not in (301,302,303,307,308):
+				break
+			url = urljoin(url,response.getheader("Location"))
+
+		## Handle the response
+		etag = response.getheader("ETag")
+		last_modified = response.getheader("Last-Modified")
+		if response.status == 304 and stored is not None:
+			return Page(stored[0],etag or stored[1],last_modified or stored[2],not_modified=True)
+		if response.status >= 300:
+			raise HTTPError(url,response.status,response.reason,response.headers,None)
+		if response.getheader("Content-Encoding","").lower() == "gzip":
+			body = zlib.decompress(body,16+zlib.MAX_WBITS)
+		text = body.decode(response.headers.get_content_charset() or "utf-8")
+		return Page(text,etag,last_modified)
+
+	def close(self):
+
+		""" Close every idle connection. """
+
+		with self._lock:
+			idle, self._idle = self._idle, {}
+		for connections in idle.values():
+			for connection in connections:
+				connection.close()
+
+### Fetch functions
+######################################################################################
+## The transport used for pages that aren't cached, which is the site itself
+## (through a connection pool) unless it's been swapped out (e.g. for an archive
+## replay, see archive.py).
+_network = PooledTransport()
+_transport = None
+
+def SetTransport(transport=None):
+
+	""" Get pages from transport, a callable taking a url and returning the page text (and raising
+	urllib's HTTPError for missing pages, like the site does), instead of the network. None goes
+	back to the network.
+
+	Transports with a True conditional attribute are called as transport(url, stored) instead,
+	with the (text, etag, last_modified) of the cached copy (or None) to revalidate, and should
+	return a Page. """
+
+	global _transport
+	_transport = transport
+
+def GetTransport():
+
+	""" The callable used to get pages that aren't in the cache. """
+
+	return _network if _transport is None else _transport
+
+def FetchPage(url,refresh=False):
+
+	""" Get the HTML text at url, going through the cache. refresh = True forces a new
+	download (which then replaces the cached copy). """
+
+	start = instrument.Start()
+	cache = GetCache()
+	if cache is not None and not refresh:
+		text = cache.get(url)
+		if text is not None:
+			instrument.Record(start,"fetch",url=url,bytes=len(text),cache="hit")
+			return text
+
+	## Go to the transport, revalidating the stored copy
+	## if it can do that.
+	transport = GetTransport()
+	if cache is not None and getattr(transport,"conditional",False):
+		page = transport(url,cache.stored(url))
+	else:
+		page = transport(url)
+	text = str(page)
+
+	## Store what came back, or just mark the stored copy
+	## as fresh if it hadn't changed.
+	not_modified = getattr(page,"not_modified",False)
+	if cache is not None:
+		if not_modified:
+			cache.touch(url)
+		else:
+			cache.put(url,text,etag=getattr(page,"etag",None),last_modified=getattr(page,"last_modified",None))
+	status = "not_modified" if not_modified else ("refresh" if refresh else "miss")
+	instrument.Record(start,"fetch",url=url,bytes=len(text),cache="off" if cache is None else status)
+	return text
+
+def FetchPages(urls,workers=8,refresh=False):
+
+	""" FetchPage for many urls at once on a thread pool, returning the page texts in
+	the same order as urls. The rate limiter still governs how fast requests actually go
+	out, workers just sets how many can be waiting at a time. """
+
+	urls = list(urls)
+	if workers is None or workers <= 1 or len(urls) <= 1:
+		return [FetchPage(url,refresh=refresh) for url in urls]
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		return list(pool.map(lambda url: FetchPage(url,refresh=refresh),urls))
+
+### Streaming
+######################################################################################
+def Window(func,items,prefetch,on_error=None):
+
+	""" Yield (item, func(item)) in order for every item, with up to prefetch calls running
+	ahead on a thread pool. Failures go to on_error(item, error) and are skipped if it's set,
+	otherwise they're raised. """
+
+	pool = ThreadPoolExecutor(max_workers=max(1,prefetch))
+	pending = collections.deque()
+	items = iter(items)
+	try:
+
+		## Fill the window, then replace each result
+		## with a new item as it's handed off.
+		for item in items:
+			pending.append((item,pool.submit(func,item)))
+			if len(pending) >= prefetch:
+				break
+		while pending:
+			item, future = pending.popleft()
+			for new in items:
+				pending.append((new,pool.submit(func,new)))
+				break
+			try:
+				result = future.result()
+			except Exception as error:
+				if on_error is None:
+					raise
+				on_error(item,error)
+				continue
+			yield item, result
+
+	finally:
+
+		## Stop anything that hasn't started, including
+		## when the consumer stops iterating early.
+		pool.shutdown(wait=True,cancel_futures=True)
+
+def IterPages(urls,workers=8,refresh=False,on_error=None):
+
+	""" FetchPages as a generator of (url, text) in the same order as urls, with only workers
+	pages in flight (or waiting to be consumed) at a time, so memory stays flat however many
+	urls there are. on_error works as in Window. """
+
+	return Window(lambda url: FetchPage(url,refresh=refresh),urls,workers,on_error)
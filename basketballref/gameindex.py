@@ -0,0 +1,137 @@
+"""gameindex.py
+
+An inverted index from players to their games over box score data that's already been scraped
+(a season harvest, or the boxscores read back from a Warehouse). Box scores carry the same basic
+stat lines as the gamelog pages, so once a league's games are stored, any player's basic game-log
+can be put together from the index without another request.
+
+The index maps each player uri (and normalized name) to the row positions of their games in the
+date sorted table, so a lookup is a dictionary access and a take on those rows. """
+import numpy as np
+import pandas as pd
+
+## From the bball lib
+from .player import GAMELOG_SCHEMA
+from .schema import ConvertTypes
+from .fetch import SeasonOf
+from .directory import NormalizeName
+
+## Columns of the basic game-log that box scores also have, in the gamelog page's order
+GAMELOG_COLUMNS = ["G","Tm","away_game","Opp","game_result","MP","FG","FGA","FG%","3P","3PA","3P%",
+				   "FT","FTA","FT%","ORB","DRB","TRB","AST","STL","BLK","TOV","PF","PTS","GmSc","+/-"]
+
+class GameIndex(object):
+
+	""" Player -> games index over a long-format box score table, with the box score uri in
+	a uri column (as from harvest.HarvestBoxScores or Warehouse.read("boxscores")). """
+
+	def __init__(self,df):
+
+		""" df = the box score table, which needs the date, uri, Player, player_uri,
+		and Tm columns as well as the stats. """
+
+		## Sort by date, so each player's row positions
+		## come out in game order.
+		self.df = df.sort_values(["date","uri"],kind="stable").reset_index(drop=True)
+		self._annotate()
+
+		## Build the inverted indexes, by uri and
+		## normalized name.
+		self._by_uri = self.df.groupby("player_uri",sort=False).indices
+		names = self.df.groupby("Player",sort=False,observed=True)["player_uri"].unique()
+		self._by_name = {}
+		for name, uris in names.items():
+			self._by_name.setdefault(NormalizeName(name),set()).update(uris)
+
+	@classmethod
+	def FromWarehouse(cls,warehouse,seasons=None):
+
+		""" Build the index from the box scores stored in a warehouse.Warehouse. """
+
+		return cls(warehouse.read("boxscores",seasons=seasons))
+
+	def __repr__(self):
+		return "Game index ({} players, {} games)".format(len(self._by_uri),self.df["uri"].nunique())
+
+	def __len__(self):
+		return len(self._by_uri)
+
+	def __contains__(self,player):
+		return player in self._by_uri or NormalizeName(player) in self._by_name
+
+	def _annotate(self):
+
+		""" Add the game-log columns that depend on the whole game (home or away, the
+		opponent, and the result) to every row at once. """
+
+		df = self.df
+		team = df["Tm"].astype(str)
+
+		## The home team is at the end of the box score uri, and
+		## the opponent is whichever team is left.
+		home = df["uri"].str[-3:]
+		df["away_game"] = team.ne(home).values
+		away_team = df.loc[df["away_game"]].groupby("uri")["Tm"].first().astype(str)
+		df["Opp"] = np.where(df["away_game"],home,df["uri"].map(away_team))
+
+		## Results from the summed points (which can be floats when read
+		## back from an older warehouse, see warehouse._dataset)
+		team_points = df.groupby(["uri",team],observed=True)["PTS"].transform("sum")
+		margin = 2*team_points-df.groupby("uri")["PTS"].transform("sum")
+		result = pd.Series(np.where(margin > 0,"W","L"),index=df.index)
+		df["game_result"] = result+" ("+margin.round().astype("int64").map("{:+d}".format)+")"
+
+	def players(self):
+
+		""" The indexed players, as a dataframe of uri, name, and number of games. """
+
+		df = self.df.groupby("player_uri",sort=True).agg(player=("Player","first"),games=("uri","size"))
+		return df.reset_index().rename(columns={"player_uri":"uri"})
+
+	def _uri(self,player):
+
+		""" Resolve a player uri or name to a uri, raising a KeyError if it's missing and a
+		ValueError if the name is shared by more than one player. """
+
+		if player in self._by_uri:
+			return player
+		uris = self._by_name.get(NormalizeName(player))
+		if not uris:
+			raise KeyError("{} isn't in the index.".format(player))
+		if len(uris) > 1:
+			raise ValueError("{} is ambiguous, use one of the uris {}.".format(player,sorted(uris)))
+		return next(iter(uris))
+
+	def games(self,player):
+
+		""" Row positions (in self.df) of a player's games, by uri or name, in date order. """
+
+		return self._by_uri[self._uri(player)]
+
+	def gamelog(self,player,seasons=None):
+
+		""" A player's basic game-log (by uri or name), in the same format as Player(uri, seasons,
+		advanced=False).df, i.e. indexed by date with the same columns and types, restricted to seasons
+		if given. The columns that only the gamelog pages have (Age and started) are left out, and the
+		game numbers (G) count the games in the index. """
+
+		rows = self.df.take(self.games(player))
+		season = SeasonOf(rows["date"])
+		if seasons is not None:
+			rows = rows.loc[season.isin(list(seasons))]
+			season = season.loc[rows.index]
+
+		## Number the games within each season and pick out
+		## the gamelog columns.
+		rows = rows.assign(G=rows.groupby(season).cumcount()+1)
+		columns = ["date"]+[c for c in GAMELOG_COLUMNS if c in rows.columns]
+		df = ConvertTypes(rows[columns].reset_index(drop=True),GAMELOG_SCHEMA)
+		return df.set_index("date")
+
+
+if __name__ == "__main__":
+
+	from .harvest import HarvestBoxScores
+	index = GameIndex(HarvestBoxScores(2018,checkpoint="2018_boxscores"))
+	print(index)
+	print(index.gamelog("LeBron James"))
@@ -0,0 +1,167 @@
+"""harvest.py
+
+Bulk collection of box scores for a whole season, driven by the box score uris in a
+SeasonSchedule. Games are fetched and parsed in parallel (within the limits set in the
+fetch module), and finished games can be checkpointed to disk so that an interrupted
+harvest picks up where it left off. """
+import os
+import warnings
+import pandas as pd
+
+## For parallel fetch/parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+## From the bball lib
+from .box_score import BOXSCORE_URL, SCHEMA, BoxScore, ParsePage
+from .schema import ConvertTypes
+from .pipeline import RunPipeline
+from .schedule import SeasonSchedule
+
+### Shared helpers (also used by stream, crawl, and the command line)
+######################################################################################
+def PlayedGames(schedule):
+
+	""" Get the list of box score uris for games that have been played from a season (int),
+	SeasonSchedule object, or schedule dataframe. """
+
+	if isinstance(schedule,SeasonSchedule):
+		schedule = schedule.df
+	elif not isinstance(schedule,pd.DataFrame):
+		schedule = SeasonSchedule(int(schedule)).df
+
+	## Games without a final score don't have a box score yet
+	played = schedule.loc[schedule["home_PTS"].notnull()]
+	return list(played["uri"].drop_duplicates())
+
+def GameFrame(uri,parsed=None):
+
+	""" Get a single game's box score as a long-format frame with the player
+	as a column and the box score uri attached. """
+
+	df = BoxScore(uri,parsed=parsed).df.reset_index()
+	df["uri"] = uri
+	return df
+
+def ProgressBar(total,progress):
+
+	""" Build an update function for progress reporting. progress can be True (use tqdm
+	if it's available), False/None (no reporting), or a callable taking (done, total). """
+
+	if callable(progress):
+		state = {"done":0}
+		def update():
+			state["done"] += 1
+			progress(state["done"],total)
+		return update, lambda: None
+	if not progress:
+		return lambda: None, lambda: None
+	try:
+		from tqdm import tqdm
+	except ImportError:
+		return lambda: None, lambda: None
+	bar = tqdm(total=total)
+	return lambda: bar.update(1), bar.close
+
+### Internal helpers
+######################################################################################
+def _run_threads(uris,workers):
+
+	""" Fetch and parse games on a thread pool, yielding (uri, df, error) as
+	they finish. """
+
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		futures = {pool.submit(GameFrame,uri):uri for uri in uris}
+		for future in as_completed(futures):
+			try:
+				yield futures[future], future.result(), None
+			except Exception as error:
+				yield futures[future], None, error
+
+def _run_processes(uris,workers,processes):
+
+	""" Fetch games on a thread pool and parse them in a process pool (see pipeline.py),
+	yielding (uri, df, error) as they finish. """
+
+	urls = {BOXSCORE_URL.format(uri):uri for uri in uris}
+	errors = []
+	for url, parsed in RunPipeline(urls,ParsePage,fetch_workers=workers,parse_workers=processes,
+								   on_error=lambda url, error: errors.append((url,error))):
+		while errors:
+			url_, error = errors.pop()
+			yield urls[url_], None, error
+		yield urls[url], GameFrame(urls[url],parsed), None
+	for url, error in errors:
+		yield urls[url], None, error
+
+### Main harvest function
+######################################################################################
+def HarvestBoxScores(schedule,workers=8,checkpoint=None,progress=True,processes=None):
+
+	""" Collect every played game's box score into one long-format player-game dataframe.
+
+	schedule: a season (int), a SeasonSchedule, or a schedule dataframe (with uri and home_PTS columns).
+	workers: number of threads fetching and parsing games.
+	checkpoint: optional directory where each finished game is stored (as a pickle). Games
+		already in the directory are loaded instead of fetched, so a rerun resumes the harvest.
+	progress: True for a tqdm progress bar (if tqdm is installed), or a callable taking (done, total).
+	processes: if set, the number of processes used to parse pages (with workers threads fetching them),
+		so that parsing scales with cores rather than being serialized on the GIL.
+
+	Games that fail are skipped with a warning, and will be tried again on the next run
+	with the same checkpoint directory. """
+
+	## Get the games to collect
+	uris = PlayedGames(schedule)
+	if checkpoint is not None:
+		os.makedirs(checkpoint,exist_ok=True)
+
+	## Load anything already finished, and set up
+	## the list of games left to go.
+	games = {}
+	todo = []
+	for uri in uris:
+		path = None if checkpoint is None else os.path.join(checkpoint,uri+".pkl")
+		if path is not None and os.path.exists(path):
+			games[uri] = pd.read_pickle(path)
+		else:
+			todo.append((uri,path))
+
+	## Fetch and parse the rest in parallel, saving
+	## each game as it finishes.
+	update, close = ProgressBar(len(uris),progress)
+	for _ in games:
+		update()
+	paths = dict(todo)
+	if processes:
+		results = _run_processes(paths,workers,processes)
+	else:
+		results = _run_threads(paths,workers)
+	failed = []
+	for uri, df, error in results:
+		update()
+		if error is not None:
+			failed.append((uri,error))
+			continue
+		if paths[uri] is not None:
+			df.to_pickle(paths[uri]+".tmp")
+			os.replace(paths[uri]+".tmp",paths[uri])
+		games[uri] = df
+	close()
+
+	## Report any failures
+	if failed:
+		warnings.warn("{} box scores failed and were skipped: {}".format(len(failed),
+					  ", ".join("{} ({})".format(uri,error) for uri, error in failed)))
+
+	## Put it all together in schedule order, restoring the
+	## categorical columns after the concatenation.
+	if not games:
+		return pd.DataFrame([],columns=["Player","uri"])
+	df = pd.concat([games[uri] for uri in uris if uri in games],axis=0,ignore_index=True,sort=False)
+	return ConvertTypes(df,SCHEMA)
+
+
+if __name__ == "__main__":
+
+	df = HarvestBoxScores(2018,checkpoint="2018_boxscores")
+	print(df)
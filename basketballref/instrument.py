@@ -0,0 +1,136 @@
+"""instrument.py
+
+Timing and counters for the stages of a scrape, to see whether a slow crawl is spending its time on
+the network, on HTML parsing, on type conversion, or on putting frames together. The fetch layer and
+each scraper report events here:
+
+	fetch: one per FetchPage call, with the url, seconds, bytes (the length of the page text), and
+		cache ("hit", "miss", "refresh", "not_modified" for a revalidated page, or "off" when the
+		cache is disabled).
+	parse: HTML to a frame of strings, with the scraper, url (when known), seconds, and rows.
+	convert: the schema type conversion, with the same fields as parse.
+	merge: the concatenations and merges that put a multi-page object (like a Player) together.
+
+Events go to observers, callables taking the event dict, which are registered with AddObserver or
+with a Collector as a context manager. With no observers registered, the hooks are a list check and
+nothing else. Events from parsing in a pipeline process pool stay in the worker processes.
+
+numpy and pandas are only imported by the Collector methods that build frames, so the hooks (which
+the fetch layer imports) don't cost anything at import time. """
+import time
+import threading
+
+## The registered observers, which the hooks check
+## before doing any work.
+_observers = []
+
+## Default histogram bin edges in seconds, log spaced
+## from 100 microseconds to 100 seconds.
+DEFAULT_BINS = tuple(10**(-4+0.25*i) for i in range(25))
+
+### Observer registry and hooks
+######################################################################################
+def AddObserver(observer):
+
+	""" Register observer, a callable taking an event dict, to see every event. """
+
+	_observers.append(observer)
+
+def RemoveObserver(observer):
+	if observer in _observers:
+		_observers.remove(observer)
+
+def Start():
+
+	""" Start timing a stage, returning the start time, or None if nobody is
+	listening (so that Record does nothing). """
+
+	return time.perf_counter() if _observers else None
+
+def Record(start,stage,**fields):
+
+	""" Finish timing a stage started with Start, sending an event with the stage, the
+	elapsed seconds, and any other fields (scraper, url, rows, bytes, cache) to the observers. """
+
+	if start is None:
+		return
+	event = {"stage":stage,"seconds":time.perf_counter()-start}
+	event.update(fields)
+	for observer in list(_observers):
+		observer(event)
+
+### Collector
+######################################################################################
+class Collector(object):
+
+	""" Observer that keeps every event, with aggregation on top. Use it as a context manager
+	to collect the events in a block:
+
+		with Collector() as stats:
+			Player("jamesle01",[2017,2018])
+		print(stats.summary()) """
+
+	def __init__(self):
+		self.events = []
+		self._lock = threading.Lock()
+
+	def __call__(self,event):
+		with self._lock:
+			self.events.append(event)
+
+	def __enter__(self):
+		AddObserver(self)
+		return self
+
+	def __exit__(self,*args):
+		RemoveObserver(self)
+
+	def __len__(self):
+		return len(self.events)
+
+	def clear(self):
+		with self._lock:
+			self.events = []
+
+	def frame(self):
+
+		""" Every event as a row of a dataframe. """
+
+		import pandas as pd
+		with self._lock:
+			events = list(self.events)
+		df = pd.DataFrame(events,columns=["stage","scraper","url","seconds","rows","bytes","cache"])
+		for column in ("stage","scraper","cache"):
+			df[column] = df[column].astype("category")
+		return df
+
+	def summary(self):
+
+		""" Aggregate the events by stage and scraper: the number of events, total, mean,
+		median, 90th percentile, and max seconds, and the rows and bytes produced. Fetches
+		also get their cache hit counts. """
+
+		df = self.frame()
+		df["scraper"] = df["scraper"].cat.add_categories([""]).fillna("")
+		df["hit"] = df["cache"].eq("hit")
+		groups = df.groupby(["stage","scraper"],observed=True)
+		summary = groups["seconds"].agg(count="count",total="sum",mean="mean",
+										median="median",p90=lambda s: s.quantile(0.9),max="max")
+		summary["rows"] = groups["rows"].sum(min_count=1)
+		summary["bytes"] = groups["bytes"].sum(min_count=1)
+		summary["cache_hits"] = groups["hit"].sum()
+		return summary
+
+	def histogram(self,stage,scraper=None,bins=DEFAULT_BINS):
+
+		""" Histogram of the seconds spent in stage (for one scraper if given), as a
+		series of counts indexed by the bin intervals. """
+
+		import numpy as np
+		import pandas as pd
+		df = self.frame()
+		seconds = df.loc[df["stage"] == stage]
+		if scraper is not None:
+			seconds = seconds.loc[seconds["scraper"] == scraper]
+		counts, edges = np.histogram(seconds["seconds"],bins=bins)
+		return pd.Series(counts,index=pd.IntervalIndex.from_breaks(edges),name=stage)
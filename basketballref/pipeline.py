@@ -0,0 +1,172 @@
+"""pipeline.py
+
+A staged fetch/parse pipeline for crawls that are big enough for parsing to be the bottleneck.
+Pages are fetched on a pool of I/O threads (through the shared cache and rate limiter), and the
+raw HTML is handed to a ProcessPoolExecutor, so the CPU bound parsing and type conversion isn't
+serialized on the GIL. The parse workers send back plain data (dataframes and strings, never
+PyQuery objects), and the stages are joined by bounded queues, so fetching can't run arbitrarily
+far ahead of parsing.
+
+Any scraper can be run this way through its module's ParsePage function, and the Crawl* functions
+wrap that up for box scores and rosters. """
+import os
+import queue
+import threading
+import multiprocessing
+
+## For the parse stage
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+## From the bball lib
+from .fetch import FetchPage
+from . import box_score, roster
+
+## Marker for a fetch worker that's out of work
+_DONE = object()
+
+## Parse workers are started from a clean server process (or spawned where that's not
+## available) rather than forked, since forking a process with fetch threads running can
+## copy a held lock (the cache's, the rate limiter's, or the import lock) into the child.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+### Fetch stage
+######################################################################################
+def _put(pages,item,stop):
+
+	""" Block on the bounded pages queue (this is the backpressure from the parse
+	stage), checking for a stop now and then. """
+
+	while not stop.is_set():
+		try:
+			pages.put(item,timeout=0.1)
+			return
+		except queue.Full:
+			continue
+
+def _fetch_worker(urls,pages,stop,refresh):
+
+	""" Pull urls off the urls queue, fetch them, and put (url, text, error) on the
+	bounded pages queue until the urls run out or the pipeline is stopped. """
+
+	while not stop.is_set():
+		try:
+			url = urls.get_nowait()
+		except queue.Empty:
+			break
+		try:
+			item = (url,FetchPage(url,refresh=refresh),None)
+		except Exception as error:
+			item = (url,None,error)
+		_put(pages,item,stop)
+	_put(pages,_DONE,stop)
+
+### Main pipeline
+######################################################################################
+def RunPipeline(urls,parse,fetch_workers=8,parse_workers=None,queue_size=32,refresh=False,on_error=None):
+
+	""" Generator that fetches every url and runs parse (a picklable, module level function
+	taking the page text, like box_score.ParsePage) on it in a process pool, yielding (url, parsed)
+	pairs as they finish (not necessarily in order).
+
+	fetch_workers: I/O threads fetching pages (the rate limiter in fetch.py still applies).
+	parse_workers: processes for parsing (os.cpu_count() by default).
+	queue_size: the maximum number of fetched pages waiting to be parsed, and of parses in flight.
+	on_error: if set, a callable taking (url, error) for pages that fail to fetch or parse, which are
+		then skipped. Otherwise the first error is raised. """
+
+	## Set up the queues between stages
+	urls = list(urls)
+	url_queue = queue.Queue()
+	for url in urls:
+		url_queue.put(url)
+	pages = queue.Queue(maxsize=queue_size)
+
+	## Handle errors from either stage
+	def _error(url,error):
+		if on_error is None:
+			raise error
+		on_error(url,error)
+
+	## Set up the parse processes (which aren't forked from
+	## this process, see START_METHOD).
+	pool = ProcessPoolExecutor(max_workers=parse_workers or os.cpu_count(),
+							   mp_context=multiprocessing.get_context(START_METHOD))
+	stop = threading.Event()
+	try:
+
+		## Start the fetch stage
+		fetch_workers = max(1,min(fetch_workers,len(urls)))
+		threads = [threading.Thread(target=_fetch_worker,args=(url_queue,pages,stop,refresh),daemon=True)
+				   for _ in range(fetch_workers)]
+		for thread in threads:
+			thread.start()
+
+		## Run the parse stage, keeping at most queue_size
+		## parses in flight.
+		pending = {}
+		running = fetch_workers
+		while running or pending:
+
+			## Submit fetched pages, blocking for one only if
+			## there's nothing else to wait on.
+			while running and len(pending) < queue_size:
+				try:
+					item = pages.get(block=not pending,timeout=None if not pending else 0.)
+				except queue.Empty:
+					break
+				if item is _DONE:
+					running -= 1
+					continue
+				url, text, error = item
+				if error is not None:
+					_error(url,error)
+					continue
+				pending[pool.submit(parse,text)] = url
+
+			## Collect whatever's finished
+			if not pending:
+				continue
+			done, _ = wait(pending,timeout=0.05,return_when=FIRST_COMPLETED)
+			for future in done:
+				url = pending.pop(future)
+				try:
+					parsed = future.result()
+				except Exception as error:
+					_error(url,error)
+					continue
+				yield url, parsed
+
+	finally:
+
+		## Shut everything down, including when the
+		## caller stops iterating early.
+		stop.set()
+		pool.shutdown(wait=True,cancel_futures=True)
+
+### Scraper specific crawls
+######################################################################################
+def CrawlBoxScores(uris,**kwargs):
+
+	""" Generator of BoxScore objects for each box score uri, fetched and parsed via RunPipeline
+	(kwargs are passed on). Box scores come out as they finish, not in the order of uris. """
+
+	urls = {box_score.BOXSCORE_URL.format(uri):uri for uri in uris}
+	for url, parsed in RunPipeline(urls,box_score.ParsePage,**kwargs):
+		yield box_score.BoxScore(urls[url],parsed=parsed)
+
+def CrawlRosters(teams,season,dropna=False,**kwargs):
+
+	""" Generator of Roster objects for each team (3 letter abbreviation) in a season, fetched and
+	parsed via RunPipeline (kwargs are passed on). """
+
+	urls = {roster.ROSTER_URL.format(team,season):team for team in teams}
+	for url, parsed in RunPipeline(urls,roster.ParsePage,**kwargs):
+		yield roster.Roster(urls[url],season,dropna=dropna,parsed=parsed)
+
+
+if __name__ == "__main__":
+
+	from .schedule import SeasonSchedule
+	schedule = SeasonSchedule(2018)
+	for boxscore in CrawlBoxScores(schedule.df.uri):
+		print(boxscore)
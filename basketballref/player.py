@@ -7,16 +7,27 @@ NB: This script actually uses the structure of the HTML to help it more - its
 a better example of how this ought to be done."""
 import numpy as np
 import pandas as pd
-from pyquery import PyQuery as pq
+
+## Shared, cached page fetching and
+## table extraction
+from .fetch import FetchPage, FetchPages
+from .tables import FindTables, ParseTable
+from .schema import STAT_SCHEMA, ConvertTypes
+from . import instrument
 
 ## Base URLs for queries
 PLAYER_LIST_URL = "https://www.basketball-reference.com/players/{0:s}/"
 GAMELOG_URL = "https://www.basketball-reference.com/players/{0:.1s}/{0:s}/gamelog/{1:d}"
 ADV_GAMELOG_URL = "https://www.basketball-reference.com/players/{0:.1s}/{0:s}/gamelog-advanced/{1:d}"
 
+## Column types for the game log and player list dataframes
+GAMELOG_SCHEMA = dict(STAT_SCHEMA,date="datetime",G="int16",Age="str",Tm="category",away_game="bool",
+					  Opp="category",game_result="str",started="int16",reason="str")
+PLAYER_LIST_SCHEMA = {"uri":"str","player":"str","first_year":"int16","last_year":"int16",
+					  "position":"category","height":"str","weight":"int16","birth_date":"str","colleges":"str"}
+
 ### String processing functions and regular expresions (internal methods)
 ######################################################################################
-replace = {"":np.nan}
 def _process_webpage(webpage):
 
 	""" Process regular and advanced gamelog webpages to extract player stat lines
@@ -26,179 +37,268 @@ def _process_webpage(webpage):
 
 	## Get the tables from the webpage (filtered to be row summable
 	## tables which are actual data tables, as opposed to tables used
-	## throughout the page just for organization).
-	tables = webpage("table").filter(".row_summable")
+	## throughout the page just for organization). This includes the tables
+	## hidden in HTML comments, which are parsed on their own.
+	tables = FindTables(webpage[0],"row_summable")
 
 	## Catch pages with no data (i.e. seasons where the player didn't play)
 	## in that case, pass an empty dataframe back.
-	if tables.size() == 0:
+	if len(tables) == 0:
 		return pd.DataFrame([],columns=["date"])
 	
 	## Process the tables into data frames
 	dfs = []
-	for table in tables.items():
-
-		## Get the column headings, changing some
-		## empty entries to more meaningful labels
-		columns = {i.attr("data-stat"):i.text() for i in table("thead")("th").items()}
-		columns["game_location"] = "away_game"
-		columns["game_result"] = "game_result"
-		columns["date_game"] = "date"
-		columns["gs"] = "started"
-
-		## Loop through the table body and collect rows
-		rows = []
-		for row in table("tbody")("tr").items():
+	columns = {}
+	for table in tables:
 
-			## Skip any subheadings
-			if row.attr("class") == "thead":
-				continue
-
-			## Extract data from valid rows
-			this_row = {i.attr("data-stat"):replace.get(i.text(),i.text()) for i in row("td").items()}
-			rows.append(this_row)
+		## Extract the table in one pass, getting the column headings
+		## and the data (with blank entries replaced by nans). The rank
+		## column from the index isn't needed.
+		header, data = ParseTable(table,missing=np.nan)
+		data.pop("ranker",None)
+		columns.update(header)
 
 		## Make a dataframe and store it
-		df = pd.DataFrame(rows)
+		df = pd.DataFrame(data)
 		dfs.append(df)
 
+	## Change some empty column headings to more
+	## meaningful labels
+	columns["game_location"] = "away_game"
+	columns["game_result"] = "game_result"
+	columns["date_game"] = "date"
+	columns["gs"] = "started"
+
 	## Concatenate the dataframes
 	df = pd.concat(dfs,axis=0,sort=False,ignore_index=True)
 
-	## Some light clean-up and type conversion
+	## Some light clean-up
 	df.rename(columns=columns,inplace=True)
-	df["away_game"] = df["away_game"].apply(lambda x: x == "@")
-	df = df.apply(lambda x: pd.to_numeric(x,errors="ignore"))
-	df["date"] = pd.to_datetime(df.date)
+	df["away_game"] = df["away_game"].eq("@")
+
+	return df
+
+def _type_convert(df):
+
+	""" Type convert the gamelog df from _process_webpage according to the schema. """
+
+	return ConvertTypes(df,GAMELOG_SCHEMA)
+
+def ParsePage(page,url=None):
+
+	""" Parse the HTML text of a regular or advanced gamelog page into a type converted df. The output
+	is plain data, so this can run in a separate process (see pipeline.py). url is only used to label
+	the timing events (see instrument.py). """
+
+	from pyquery import PyQuery as pq
+	start = instrument.Start()
+	df = _process_webpage(pq(page,parser="html"))
+	instrument.Record(start,"parse",scraper="player",url=url,rows=len(df))
+	start = instrument.Start()
+	df = _type_convert(df)
+	instrument.Record(start,"convert",scraper="player",url=url,rows=len(df))
+	return df
 
+def _process_player_list(webpage):
+
+	""" Process a player list PQ webpage (the players for one letter) into a dataframe
+	of strings. """
+
+	## Use pyquery to extract the table object on it.
+	webpage = webpage("table")
+	
+	## Extract the table in one pass. The column names come from
+	## the header's aria-label attribute, and the URI and player name from
+	## the row index.
+	header, table = ParseTable(webpage[0],header_attr="aria-label",
+							   extras={"uri":("player","data-append-csv")})
+	columns = {stat:(label or stat).lower().replace(" ","_") for stat, label in header.items()}
+
+	## Make it a dataframe
+	df = pd.DataFrame(table)
+
+	## Clean up the column names, etc.
+	df = df.rename(columns=columns)
+	df["player"] = df.player.str.replace("*","")
 	return df
 
 ### Player object and method for list retreival
 ######################################################################################
-def GetPlayerList(letters="abcdefghijklmnopqrstuvwyz"):
+def GetPlayerList(letters="abcdefghijklmnopqrstuvwyz",workers=None):
 
 	""" Get a list of all players with basic info (when they were active, weight, height, and
 	position). Notice the default letters don't include x, since basketball_reference.com has no
 	x page (i.e. no players ever have a list name that starts with x). 
 
 	This method returns a dataframe with players as indices, information as columns. The key info here
-	is the abbreviation associated with their player profile URL. """
+	is the abbreviation associated with their player profile URL. 
 
-	## Loop over letters for each webpage and collect
-	## names one-by-one
-	dfs = []
-	for letter in letters:
-
-		## Get the webpage and slice it and use pyquery
-		## to extract the table object on it.
-		webpage = pq(PLAYER_LIST_URL.format(letter))("table")
-		
-		## Rip the header off of the table object to get the
-		## column names (from the aria-label attribute). This is a dictionary
-		## keeping track of how they're referenced in the table body.
-		columns = {entry.attr("data-stat"):entry.attr("aria-label").lower().replace(" ","_") for entry in webpage("thead")("th").items()}
-
-		## Get the rest of the table by looping through rows in
-		## the body and retreiving entries
-		table = []
-		for tr in webpage("tbody")("tr").items():
-				
-			## Initialize the row
-			this_row = {}
-
-			## Get the URI and player name from the row index
-			this_row["uri"] = tr("th").attr("data-append-csv")
-			this_row["player"] = tr("th").text()
-
-			## Append whatever data remains in the following
-			## columns.
-			for entry in tr("td").items():
-				this_row[entry.attr("data-stat")] = entry.text()
-
-			## Store the row
-			table.append(this_row)
-
-		## Make it a dataframe
-		df = pd.DataFrame(table)
-
-		## Clean up the column names, etc.
-		df = df.rename(columns=columns)
-		df["player"] = df.player.str.replace("*","")
-		df = df.apply(lambda x: pd.to_numeric(x,errors="ignore"))
-
-		## Store it
-		dfs.append(df)
+	workers = if set, the number of threads used to fetch the letter pages concurrently. """
+
+	## Get the webpages for every letter (concurrently if
+	## workers is set)
+	pages = FetchPages([PLAYER_LIST_URL.format(letter) for letter in letters],workers=workers)
 
-	return pd.concat(dfs,axis=0)
+	## Process the letters' webpages one-by-one
+	from pyquery import PyQuery as pq
+	dfs = []
+	for letter, page in zip(letters,pages):
+		url = PLAYER_LIST_URL.format(letter)
+		start = instrument.Start()
+		df = _process_player_list(pq(page,parser="html"))
+		instrument.Record(start,"parse",scraper="player_list",url=url,rows=len(df))
+		start = instrument.Start()
+		dfs.append(ConvertTypes(df,PLAYER_LIST_SCHEMA))
+		instrument.Record(start,"convert",scraper="player_list",url=url,rows=len(df))
+
+	## Put it together, restoring the categorical
+	## columns after the concatenation.
+	start = instrument.Start()
+	df = ConvertTypes(pd.concat(dfs,axis=0),PLAYER_LIST_SCHEMA)
+	instrument.Record(start,"merge",scraper="player_list",rows=len(df))
+	return df
 
 class Player(object):
 
 	""" Basic player object, which encapsulates player information and a dataframe of
 	the player's game log. """
 
-	def __init__(self,uri,seasons,advanced=True):
+	def __init__(self,uri,seasons,advanced=True,workers=None,lazy=False):
 
 		""" uri = URL specific look up associated with the player. See the full player list for details.
-		An example is jordami01 for Jordan, etc. """
+		An example is jordami01 for Jordan, etc. 
 
-		## Store the URI for reference
+		workers = if set, the number of threads used to fetch all the season x page combinations
+		concurrently up front (subject to the rate limit in the fetch module). Otherwise pages are
+		fetched one after another. Either way the resulting df is the same.
+
+		lazy = True to skip fetching anything up front. Each season's basic and advanced pages are then
+		fetched and parsed the first time they're needed (by get, season, or df) and kept, so looking at
+		one season of a long career only costs that season's pages. """
+
+		## Store the URI, seasons, and the pages to use for reference
 		self._uri = uri
+		self.seasons = list(seasons)
+		self.advanced = advanced
+		self.workers = workers
 		if advanced:
-			base_urls = [GAMELOG_URL,ADV_GAMELOG_URL]
+			self._base_urls = [GAMELOG_URL,ADV_GAMELOG_URL]
 		else:
-			base_urls = [GAMELOG_URL]
-		
-		## Loop over seasons to collect game logs for each -
-		## seasons can be found in the full player list. This is 
-		## encased in loop over URLs, since advanced stats are on
-		## a seperate page
-		to_merge = []
-		for base_url in base_urls:
-			
-			## Initialize storage for all the data from
-			## this base url (basic/advanced)
-			dfs = []
-			for season in seasons:
-
-				## Get the webpage
-				url = base_url.format(self._uri,season)
-				webpage = pq(url)
-
-				## In this case, some tables (particularly the playoff tables)
-				## are hidden in the HTML comments (I don't understand this),
-				## so I have to forcibly uncomment that section.
-				webpage = str(webpage).replace("\n<!--\n","\n").replace("\n-->\n","\n")
-				webpage = pq(webpage)
-
-				## Extract the table from the webpage
-				## as a dataframe.
-				df = _process_webpage(webpage)
-
-				## And append it to the list
-				dfs.append(df)
-
-			## Put it all together, index by date,
-			## and save it to be merged.
-			to_merge.append(pd.concat(dfs,ignore_index=True,sort=False).set_index("date"))
+			self._base_urls = [GAMELOG_URL]
 
-		## Merge if needed by finding new columns in the
-		## advanced page and adding them to the basic page.
-		if advanced:
-			columns_to_add = to_merge[1].columns.difference(to_merge[0].columns)
-			self.df = pd.concat([to_merge[0],to_merge[1][columns_to_add]],axis=1)
-		else:
-			self.df = to_merge[0]
+		## Storage for the parsed pages, by URL, which are filled
+		## in as needed, and the full df once it's been put together.
+		self._pages = {}
+		self._df = None
 
 		## Create a title based on the seasons selected.
 		if len(seasons) == 1:
-			self.title = uri+", {} game-log".format(seasons[0])
+			self.title = uri+", {} game-log".format(self.seasons[0])
 		else:
-			self.title = uri+", {}-{} game-log".format(seasons[0],seasons[-1])
+			self.title = uri+", {}-{} game-log".format(self.seasons[0],self.seasons[-1])
 		self.title += (1-advanced)*" (basic only)"
 
+		## Unless we're being lazy, put the whole
+		## game-log together now.
+		if not lazy:
+			self._df = self.get()
+
 	def __repr__(self):
 		return self.title
 
+	@property
+	def df(self):
+
+		""" The game-log for every season, indexed by date. In lazy mode, this only fetches
+		the pages that haven't been needed yet. """
+
+		if self._df is None:
+			self._df = self.get()
+		return self._df
+
+	@df.setter
+	def df(self,df):
+		self._df = df
+
+	def loaded(self):
+
+		""" The (season, advanced) page combinations that have been fetched and parsed so far. """
+
+		return [(season,base_url == ADV_GAMELOG_URL) for base_url in self._base_urls
+				for season in self.seasons if base_url.format(self._uri,season) in self._pages]
+
+	def _load(self,base_urls,seasons):
+
+		""" Fetch and parse whatever pages for seasons aren't loaded yet, concurrently if
+		workers is set, returning the parsed pages by base url (each a list in season order). """
+
+		## Fetch all the missing pages at once if we're working
+		## concurrently, otherwise they're fetched one-by-one below.
+		urls = [base_url.format(self._uri,season) for base_url in base_urls for season in seasons]
+		missing = [url for url in urls if url not in self._pages]
+		pages = {}
+		if self.workers is not None and missing:
+			pages = dict(zip(missing,FetchPages(missing,workers=self.workers)))
+
+		## Parse the new pages. In this case, some tables (particularly the playoff
+		## tables) are hidden in the HTML comments (I don't understand this), but
+		## _process_webpage picks those out of the comments directly.
+		for url in missing:
+			page = pages[url] if url in pages else FetchPage(url)
+			self._pages[url] = ParsePage(page,url=url)
+
+		return {base_url:[self._pages[base_url.format(self._uri,season)] for season in seasons]
+				for base_url in base_urls}
+
+	def get(self,columns=None,seasons=None,advanced=None):
+
+		""" The game-log for seasons (all of them by default), indexed by date, fetching
+		only the pages that are needed. If columns is given and they're all on the basic
+		page, or advanced = False, the advanced pages aren't touched. """
+
+		## Figure out which seasons and pages are needed, starting
+		## with the basic pages for the seasons at hand.
+		seasons = self.seasons if seasons is None else list(seasons)
+		base_urls = self._base_urls
+		if advanced is False:
+			base_urls = [GAMELOG_URL]
+		elif advanced and not self.advanced:
+			raise ValueError("{} was created with advanced=False.".format(self._uri))
+		if columns is not None and len(base_urls) > 1:
+			basic = self._load([GAMELOG_URL],seasons)[GAMELOG_URL]
+			if set().union(*(df.columns for df in basic)).issuperset(columns):
+				base_urls = [GAMELOG_URL]
+
+		## Put the seasons together for each page type (restoring the column
+		## types, since categories differ between seasons), indexed by date.
+		to_merge = []
+		for base_url, dfs in self._load(base_urls,seasons).items():
+			start = instrument.Start()
+			df = ConvertTypes(pd.concat(dfs,ignore_index=True,sort=False),GAMELOG_SCHEMA)
+			to_merge.append(df.set_index("date"))
+			instrument.Record(start,"merge",scraper="player",rows=len(df))
+
+		## Merge if needed by finding new columns in the
+		## advanced page and adding them to the basic page.
+		start = instrument.Start()
+		if len(to_merge) > 1:
+			columns_to_add = to_merge[1].columns.difference(to_merge[0].columns)
+			df = pd.concat([to_merge[0],to_merge[1][columns_to_add]],axis=1)
+		else:
+			df = to_merge[0]
+		instrument.Record(start,"merge",scraper="player",rows=len(df))
+
+		if columns is not None:
+			df = df[[c for c in columns if c != "date"]]
+		return df
+
+	def season(self,season,advanced=None):
+
+		""" The game-log for a single season, with the advanced columns unless advanced = False
+		(by default, whatever the Player was created with). """
+
+		return self.get(seasons=[season],advanced=advanced)
+
 
 if __name__ == "__main__":
 
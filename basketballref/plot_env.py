@@ -1,18 +1,27 @@
 """plot_env.py
 
-A default plotting environment. """
-
-import matplotlib.pyplot as plt
+A default plotting environment. Nothing changes on import, call UsePlotStyle() to apply it
+(matplotlib is only imported then). """
 
 ## Custom global matplotlib parameters
 ## see http://matplotlib.org/users/customizing.html for details.
-plt.rcParams["font.size"] = 22.
-plt.rcParams["font.family"] = "serif"
-plt.rcParams["font.sans-serif"] = "DejaVu Sans"
-plt.rcParams["font.serif"] = "Garamond"
-plt.rcParams["xtick.labelsize"] = "medium"
-plt.rcParams["ytick.labelsize"] = "medium"
-plt.rcParams["legend.fontsize"] = "medium"
-plt.rcParams["axes.linewidth"] = 1.0
-plt.rcParams["axes.formatter.use_mathtext"] = True
-plt.rcParams["mathtext.fontset"] = "cm"
\ No newline at end of file
+STYLE = {"font.size":22.,
+		 "font.family":"serif",
+		 "font.sans-serif":"DejaVu Sans",
+		 "font.serif":"Garamond",
+		 "xtick.labelsize":"medium",
+		 "ytick.labelsize":"medium",
+		 "legend.fontsize":"medium",
+		 "axes.linewidth":1.0,
+		 "axes.formatter.use_mathtext":True,
+		 "mathtext.fontset":"cm"}
+
+def UsePlotStyle(overrides=None):
+
+	""" Apply the style to matplotlib's global rcParams, along with overrides, an
+	optional dict of other rcParams settings. """
+
+	import matplotlib.pyplot as plt
+	plt.rcParams.update(STYLE)
+	if overrides:
+		plt.rcParams.update(overrides)
@@ -4,11 +4,22 @@ Methods to scrape active roster information from team pages on
 basketball-ref.com. """
 import numpy as np
 import pandas as pd
-from pyquery import PyQuery as pq
+
+## Shared, cached page fetching and
+## table extraction
+from .fetch import FetchPage, FetchPages
+from .tables import ParseTable
+from .schema import ConvertTypes
+from . import instrument
 
 ## Base URL for queries
 ROSTER_URL = "https://www.basketball-reference.com/teams/{0:s}/{1:d}.html"
 
+## Column types for the roster dataframe, and for
+## the league-wide table.
+SCHEMA = {"number":"int16","player":"str","uri":"str"}
+LEAGUE_SCHEMA = dict(SCHEMA,team="category")
+
 ### String processing functions and regular expresions
 ######################################################################################
 def _process_webpage(webpage):
@@ -23,39 +34,40 @@ def _process_webpage(webpage):
 	header = header[:header.find("\nMore Team Info")]
 	header = header[header.find("About logos")+len("About logos\n"):]
 
-	## Process the table into a dataframe
+	## Process the table in one pass, getting the player number
+	## from the index, the name, and the player's bball ref URI from the
+	## link in the name column. Blank entries are replaced with nans.
 	table = webpage("table")
+	_, data = ParseTable(table[0],extras={"uri":("player","href")},missing=np.nan)
 
-	## Extract the data from the table body, replacing
-	## blank entries with nans
-	body = table("tbody")
-	rows = []
-	replace = {"":np.nan}
-	for row in body("tr").items():
+	## Construct a dataframe for this table, trimming
+	## the links down to URIs
+	df = pd.DataFrame({"number":data["number"],"player":data["player"],"uri":data["uri"]})
+	df["uri"] = df.uri.str.replace(r"^.*/|\..*$","",regex=True)
+	
+	return header, df
 
-		## Get the player number
-		number = row("th").text()
-		number = replace.get(number,number)
+def _type_convert(df):
 
-		## Get the player name
-		name = row("td").eq(0).text()
+	""" Process the column types according to the schema and handle
+	duplicate rows (which appear sometimes). """
 
-		## Get the player's bball ref URI
-		uri = row("td").eq(0)("a").attr("href")
-		uri = uri[uri.rfind("/")+1:uri.find(".")]
-	
-		## Store this row
-		rows.append([number,name,uri])
+	return ConvertTypes(df,SCHEMA).drop_duplicates()
 
-	## Construct a dataframe for this table
-	df = pd.DataFrame(rows,columns=["number","player","uri"])
+def ParsePage(page,url=None):
 
-	## Process the column types and handle
-	## duplicate rows (which appear sometimes)
-	df = df.apply(lambda x: pd.to_numeric(x,errors="ignore"))
-	df = df.drop_duplicates()
-	
-	return header, df
+	""" Parse the HTML text of a roster page into (description, df). The output is plain data, so
+	this can run in a separate process (see pipeline.py) and be handed to Roster via parsed. url
+	is only used to label the timing events (see instrument.py). """
+
+	from pyquery import PyQuery as pq
+	start = instrument.Start()
+	description, df = _process_webpage(pq(page,parser="html"))
+	instrument.Record(start,"parse",scraper="roster",url=url,rows=len(df))
+	start = instrument.Start()
+	df = _type_convert(df)
+	instrument.Record(start,"convert",scraper="roster",url=url,rows=len(df))
+	return description, df
 
 ### Base object
 ######################################################################################
@@ -64,21 +76,24 @@ class Roster(object):
 	"""Basic roster object, which encapsulates some basic team information and a dataframe
 	with the roster for a given season."""
 
-	def __init__(self,team,season,dropna=False):
+	def __init__(self,team,season,dropna=False,parsed=None):
 
 		""" team = 3 letter team abrieviation, which can be found in a number of places (e.g. box scores). 
-		season is an integer for the year of the allstar weekend in a give season."""
+		season is an integer for the year of the allstar weekend in a give season.
+		parsed = the output of ParsePage for this roster, if the page has already been fetched and
+		parsed elsewhere (like in a pipeline.RunPipeline process pool). """
 
 		## Store the team, year, and the URL for reference
 		self._team = team
 		self._season = season
 		self.url = ROSTER_URL.format(self._team,self._season)
 
-		## Retrieve the HTML text via pyquery 
-		webpage = pq(self.url)
-
-		## Process the webpage to extract the roster table
-		self.description, self.df = _process_webpage(webpage)
+		## Retrieve the HTML text via the shared (cached) fetch layer
+		## and process it to extract the roster table, unless that's
+		## already been done.
+		if parsed is None:
+			parsed = ParsePage(FetchPage(self.url),url=self.url)
+		self.description, self.df = parsed
 
 		## Drop na in the dataframe if specified
 		if dropna:
@@ -88,6 +103,53 @@ class Roster(object):
 		return self.description
 
 
+### League-wide rosters
+######################################################################################
+def _team_codes(source):
+
+	""" The team abbreviations in a season, from a schedule (a SeasonSchedule or its df),
+	where every team shows up at the end of its home games' box score uris, or from a box
+	score table with a Tm column. """
+
+	df = getattr(source,"df",source)
+	if "Tm" in df.columns:
+		codes = df["Tm"].astype(str)
+	else:
+		codes = df["uri"].str[-3:]
+	return sorted(codes.dropna().unique())
+
+def LeagueRosters(season,teams=None,workers=8,dropna=False):
+
+	""" Every team's roster in a season as one table, indexed by player uri with a team column.
+	Players who changed teams during the season appear once per team.
+
+	teams: the team abbreviations, or a source to find them in (a SeasonSchedule, a schedule
+		df, or a box score table). By default, the season's schedule is used (with its month
+		pages fetched at once too).
+	workers: threads fetching pages at once (through the shared rate limiter). """
+
+	## Figure out which teams there are
+	if teams is None:
+		from .schedule import SeasonSchedule
+		teams = SeasonSchedule(season,workers=workers)
+	if not isinstance(teams,(list,tuple)):
+		teams = _team_codes(teams)
+
+	## Fetch every page at once, and then parse them
+	urls = [ROSTER_URL.format(team,season) for team in teams]
+	dfs = []
+	for team, url, page in zip(teams,urls,FetchPages(urls,workers=workers)):
+		_, df = ParsePage(page,url=url)
+		df["team"] = team
+		dfs.append(df)
+
+	## Put it all together
+	df = ConvertTypes(pd.concat(dfs,axis=0,ignore_index=True),LEAGUE_SCHEMA)
+	if dropna:
+		df = df.dropna()
+	return df.set_index("uri")
+
+
 if __name__ == "__main__":
 
 	r = Roster("PHO",2019)
@@ -4,7 +4,13 @@ Functionality to retrieve season schedules from basketball-reference.com
 HTML queries. """
 import numpy as np
 import pandas as pd
-from pyquery import PyQuery as pq
+
+## Shared, cached page fetching and
+## table extraction
+from .fetch import CurrentSeason, FetchPage, Window
+from .tables import ParseTable
+from .schema import ConvertTypes
+from . import instrument
 
 ## For 404 errors
 from urllib.error import HTTPError
@@ -12,6 +18,10 @@ from urllib.error import HTTPError
 ## Base URL for queries and month options for the season (in order).
 SCHEDULE_URL = "https://www.basketball-reference.com/leagues/NBA_{0:d}_games-{1:s}.html"
 
+## Column types for the schedule dataframe
+SCHEMA = {"date":"datetime","away":"category","home":"category","home_PTS":"int16","away_PTS":"int16",
+		  "attendance":"int32","uri":"str"}
+
 ## Useful global utilities
 all_months = ("october","november","december","january","february","march","april","may","june")
 
@@ -23,35 +33,44 @@ def _process_webpage(webpage):
 	so that the table can be used to easily look up box scores. """
 
 	## Extract the page's table from the main
-	## body of the webpage.
+	## body of the webpage in one pass, getting the URI for each
+	## game from the index.
 	table = webpage("table")
+	_, data = ParseTable(table[0],extras={"uri":("date_game","csk")})
+
+	## Make a dataframe, keeping specific columns
+	## and renaming them to specific preferences.
+	df = pd.DataFrame(data)
+	df = df[["date_game","visitor_team_name","home_team_name","home_pts","visitor_pts","attendance","uri"]]
+	df.columns = ["date","away","home","home_PTS","away_PTS","attendance","uri"]
 
-	## Get the rows from the table body
-	body = table("tbody")
-	#print(body)
-	rows = []
-	for row in body("tr").items(): 
+	## Drop the playoffs line (which intersects the
+	## tables in April), in case it isn't marked as a subheading.
+	df = df.loc[df.date != "Playoffs"].reset_index(drop=True)
 
-		## Get all the columns
-		this_row = {entry.attr("data-stat"):entry.text() for entry in row("td").items()}
+	return df
 
-		## Get the date and URI from the index
-		this_row["date"] = row("th").eq(0).text()
-		this_row["uri"] = row("th").eq(0).attr("csk")
+def _type_convert(df):
 
-		## Store the row as long as the date
-		## isn't the playoffs line (which intersects the
-		## tables in April).
-		if this_row["date"] == "Playoffs":
-			continue
-		rows.append(this_row)
+	""" Type convert the schedule df according to the schema, removing the
+	thousands separators from the attendance first. """
 
-	## Make a dataframe, keeping specific columns
-	## and renaming them to specific preferences.
-	df = pd.DataFrame(rows)
-	df = df[["date","visitor_team_name","home_team_name","home_pts","visitor_pts","attendance","uri"]]
-	df.columns = ["date","away","home","home_PTS","away_PTS","attendance","uri"]
+	df["attendance"] = df.attendance.str.replace(",","")
+	return ConvertTypes(df,SCHEMA)
 
+def ParsePage(page,url=None):
+
+	""" Parse the HTML text of a monthly schedule page into a type converted df. The output is
+	plain data, so this can run in a separate process (see pipeline.py). url is only used to
+	label the timing events (see instrument.py). """
+
+	from pyquery import PyQuery as pq
+	start = instrument.Start()
+	df = _process_webpage(pq(page,parser="html"))
+	instrument.Record(start,"parse",scraper="schedule",url=url,rows=len(df))
+	start = instrument.Start()
+	df = _type_convert(df)
+	instrument.Record(start,"convert",scraper="schedule",url=url,rows=len(df))
 	return df
 
 ### Work-horse class
@@ -60,7 +79,7 @@ class SeasonSchedule(object):
 
 	""" Basic object for the schedule dataframe and meta-data from a particular season. """
 
-	def __init__(self,season,months=all_months):
+	def __init__(self,season,months=all_months,workers=4):
 		
 		""" This function encapsulates the queary and processing to turn the table on
 		bball-ref.com (see schedule URL above) into a pandas df. 
@@ -68,35 +87,23 @@ class SeasonSchedule(object):
 		season: int, year of the january in the season (i.e. season that starts October 2017 is the
 		2018 season since it goes till June 2018).
 		months: option iterable containing strings of months of the season to retrieve (since the pages are
-		monthly on the website)."""
+		monthly on the website).
+		workers: month pages fetched at once (through the shared rate limiter)."""
 
 		## Store the meta data.
 		self.season = season
 		self.months = months
 
-		## Loop over months to retrieve individual dataframes
-		dfs = []
-		for month in self.months:
-
-			## Get the webpage text via PyQuery
-			## This is done with an exception catch to get shortened seasons
-			## like the 2011-12 season.
-			try:
-				webpage = pq(SCHEDULE_URL.format(self.season,month.lower()))
-			except HTTPError:
-				continue
-
-			## Extract the table as a dataframe
-			df = _process_webpage(webpage)
-
-			## Add this month's to the total
-			dfs.append(df)
+		## Retrieve the months' dataframes concurrently, which are
+		## kept by month so the schedule can be refreshed incrementally
+		## (see refresh below).
+		self._month_dfs = {}
+		for month, df in Window(self._fetch_month,self.months,workers):
+			if df is not None:
+				self._month_dfs[month] = df
 
 		## Create the full df
-		self.df = pd.concat(dfs,axis=0,ignore_index=True)
-
-		## Change the date series to datetime
-		self.df["date"] = pd.to_datetime(self.df["date"])
+		self._build()
 		
 		## And the title string
 		self.name = "{}-{} season schedule".format(season-1,season)
@@ -104,9 +111,75 @@ class SeasonSchedule(object):
 	def __repr__(self):
 		return self.name
 
+	def _fetch_month(self,month,refresh=False):
+
+		""" Get the dataframe for a single month, or None if there's no page for it. Missing pages
+		(404s) are expected for shortened seasons like the 2011-12 season, but other HTTP errors
+		(like being rate limited) are passed on rather than silently dropping the month. """
+
+		## Get the webpage text via the shared (cached) fetch layer
+		url = SCHEDULE_URL.format(self.season,month.lower())
+		try:
+			page = FetchPage(url,refresh=refresh)
+		except HTTPError as error:
+			if error.code == 404:
+				return None
+			raise
+
+		## Extract the table as a dataframe
+		return ParsePage(page,url=url)
+
+	def _build(self):
+
+		""" Put the full df together from the monthly dfs. """
+
+		## Concatenate in season order
+		start = instrument.Start()
+		self.df = pd.concat([self._month_dfs[m] for m in self.months if m in self._month_dfs],
+							axis=0,ignore_index=True)
+
+		## Restore the column types (the team categories
+		## differ from month to month)
+		self.df = ConvertTypes(self.df,SCHEMA)
+		instrument.Record(start,"merge",scraper="schedule",rows=len(self.df))
+
+	def complete_months(self):
+
+		""" The months where every game has been played, i.e. has a home_PTS entry. """
+
+		return [m for m in self.months if m in self._month_dfs and self._month_dfs[m]["home_PTS"].notnull().all()]
+
+	def refresh(self):
+
+		""" Refetch the months that aren't complete yet (skipping the network cache), leaving
+		finished months alone, and rebuild df. Months without a page are retried too, unless the
+		season is over.
+
+		Returns a dataframe of the games that finished since the last fetch (same columns as df), which
+		can go straight to harvest.HarvestBoxScores to collect just the new box scores. """
+
+		## Keep track of what was finished before
+		finished = set(self.df.loc[self.df["home_PTS"].notnull(),"uri"])
+
+		## Refetch the unfinished months
+		complete = set(self.complete_months())
+		past_season = self.season < CurrentSeason()
+		for month in self.months:
+			if month in complete or (past_season and month not in self._month_dfs):
+				continue
+			df = self._fetch_month(month,refresh=True)
+			if df is not None:
+				self._month_dfs[month] = df
+		self._build()
+
+		## Find the newly finished games
+		new = self.df["home_PTS"].notnull() & ~self.df["uri"].isin(finished)
+		return self.df.loc[new].reset_index(drop=True)
+
 
 if __name__ == "__main__":
 
 	schedule = SeasonSchedule(1988)
 	print(schedule)
 	print(schedule.df)
+	print(schedule.refresh())
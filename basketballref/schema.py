@@ -0,0 +1,119 @@
+"""schema.py
+
+Schema driven type conversion for the scraped tables. Each module describes its table's
+columns with a dictionary of column label -> kind, and ConvertTypes applies the whole
+schema with vectorized pandas operations (no per-row Python). The kinds are:
+
+	int16, int32: integer counts, stored compactly. Columns with missing values (like games
+		a player sat out) use pandas' nullable Int16/Int32 instead, so they stay integers.
+	float32: percentages, ratings, and other fractional stats.
+	minutes: "mm:ss" strings, converted to float32 minutes.
+	category: repeated labels like team names.
+	bool, datetime: as you'd expect.
+	str: left as is.
+
+Columns that aren't in the schema are converted to numbers if (and only if) every entry
+converts, which is what pd.to_numeric(errors="ignore") used to do. ConvertTypes is cheap to
+apply again to an already converted frame, which is useful for restoring the categorical
+columns after a pd.concat of frames with different categories. """
+import numpy as np
+import pandas as pd
+
+## Box score stat lines, which are shared by box scores and
+## player game logs (basic and advanced).
+STAT_SCHEMA = {"MP":"minutes",
+			   "FG":"int16","FGA":"int16","FG%":"float32",
+			   "3P":"int16","3PA":"int16","3P%":"float32",
+			   "FT":"int16","FTA":"int16","FT%":"float32",
+			   "ORB":"int16","DRB":"int16","TRB":"int16",
+			   "AST":"int16","STL":"int16","BLK":"int16","TOV":"int16","PF":"int16",
+			   "PTS":"int16","+/-":"int16","GmSc":"float32",
+			   "TS%":"float32","eFG%":"float32","3PAr":"float32","FTr":"float32",
+			   "ORB%":"float32","DRB%":"float32","TRB%":"float32","AST%":"float32",
+			   "STL%":"float32","BLK%":"float32","TOV%":"float32","USG%":"float32",
+			   "ORtg":"int16","DRtg":"int16","BPM":"float32"}
+
+### Column converters
+######################################################################################
+def _to_numeric(series):
+
+	""" Numeric version of series if every entry converts, otherwise series itself. """
+
+	if series.dtype.kind in "biuf":
+		return series
+	converted = pd.to_numeric(series,errors="coerce")
+	if (converted.isnull() & series.notnull()).any():
+		return series
+	return converted
+
+def _to_int(series,dtype):
+
+	""" Integers as dtype, or its nullable version (like Int16) if there are missing values. """
+
+	if series.dtype.kind not in "biuf":
+		series = pd.to_numeric(series,errors="coerce")
+	if series.isnull().any():
+
+		## Truncated like astype does below, since the nullable
+		## types refuse fractional values.
+		if series.dtype.kind == "f":
+			series = np.trunc(series)
+		return series.astype(np.dtype(dtype).name.capitalize())
+	return series.astype(dtype)
+
+def _to_float(series):
+	if series.dtype.kind not in "biuf":
+		series = pd.to_numeric(series,errors="coerce")
+	return series.astype(np.float32)
+
+def _to_minutes(series):
+
+	""" Convert "mm:ss" strings to minutes by splitting the strings, not row by row. """
+
+	if series.dtype.kind in "biuf" or series.empty:
+		return series.astype(np.float32)
+	parts = series.astype("string").str.split(":",n=1,expand=True)
+	minutes = pd.to_numeric(parts[0],errors="coerce")
+	if parts.shape[1] > 1:
+		seconds = pd.to_numeric(parts[1],errors="coerce").fillna(0)
+		minutes = minutes + seconds/60.
+	return minutes.astype(np.float32)
+
+def _to_category(series):
+	if isinstance(series.dtype,pd.CategoricalDtype):
+		return series
+	return series.astype("category")
+
+def _to_bool(series):
+	if series.dtype.kind == "b":
+		return series
+	return series.astype(bool)
+
+def _to_datetime(series):
+	if series.dtype.kind == "M":
+		return series
+	return pd.to_datetime(series)
+
+converters = {"int16":lambda s: _to_int(s,np.int16),
+			  "int32":lambda s: _to_int(s,np.int32),
+			  "float32":_to_float,
+			  "minutes":_to_minutes,
+			  "category":_to_category,
+			  "bool":_to_bool,
+			  "datetime":_to_datetime,
+			  "str":lambda s: s}
+
+### Main conversion function
+######################################################################################
+def ConvertTypes(df,schema):
+
+	""" Convert the columns of df in place according to schema (a dictionary of column
+	label -> kind, see above), and return it for convenience. """
+
+	for column in df.columns:
+		kind = schema.get(column)
+		if kind is None:
+			df[column] = _to_numeric(df[column])
+		else:
+			df[column] = converters[kind](df[column])
+	return df
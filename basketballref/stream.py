@@ -0,0 +1,92 @@
+"""stream.py
+
+Generators over box scores and gamelogs, for jobs that are too big to hold every game in
+memory at once. Each game (or season of a gamelog) is yielded as a long-format frame as
+soon as it's parsed, with a fixed window of pages being fetched and parsed ahead of the
+consumer, so memory stays flat no matter how many seasons are covered. The frames can go
+straight into a reducer, or be grouped with Batched for a writer like Warehouse.append. """
+import pandas as pd
+
+## From the bball lib
+from .fetch import Window
+from .player import Player
+from .schema import ConvertTypes
+from .harvest import PlayedGames, GameFrame
+
+### Shared helpers (also used by the command line)
+######################################################################################
+def GamelogFrame(item):
+
+	""" A single season of a gamelog as a long-format frame, with the player's
+	uri attached. item is a (uri, season, advanced) tuple, so it can go through Window. """
+
+	uri, season, advanced = item
+	df = Player(uri,[season],advanced=advanced).df.reset_index()
+	df["uri"] = uri
+	return df
+
+### Internal helpers
+######################################################################################
+def _concat(frames,schema):
+	df = pd.concat(frames,axis=0,ignore_index=True,sort=False)
+	return df if schema is None else ConvertTypes(df,schema)
+
+### Generators
+######################################################################################
+def IterBoxScores(games,prefetch=8,on_error=None):
+
+	""" Generator of long-format player-game frames (like HarvestBoxScores, with the box score
+	uri attached), one per game in schedule order.
+
+	games: a season (int), a SeasonSchedule, a schedule dataframe, or a list of box score uris.
+	prefetch: the number of games being fetched and parsed ahead of the consumer.
+	on_error: if set, a callable taking (uri, error) for games that fail, which are then
+		skipped. Otherwise the first error is raised. """
+
+	if isinstance(games,(list,tuple,pd.Series)):
+		uris = list(games)
+	else:
+		uris = PlayedGames(games)
+	for _, df in Window(GameFrame,uris,prefetch,on_error):
+		yield df
+
+def IterGamelogs(uri,seasons,advanced=True,prefetch=4,on_error=None):
+
+	""" Generator of a player's gamelog one season at a time (as long-format frames with the
+	date as a column and the player's uri attached), with prefetch seasons loading ahead.
+	on_error works as in IterBoxScores, with (season, error). """
+
+	items = [(uri,season,advanced) for season in seasons]
+	errors = None if on_error is None else lambda item, error: on_error(item[1],error)
+	for _, df in Window(GamelogFrame,items,prefetch,errors):
+		yield df
+
+def Batched(frames,rows=50000,schema=None):
+
+	""" Group a stream of frames (like the ones from IterBoxScores) into frames of at least
+	rows rows (the last one can be smaller), for writers that do better with fewer, bigger
+	writes. schema, if given (like box_score.SCHEMA), is applied to each batch to restore
+	the column types after the concatenation. """
+
+	batch = []
+	size = 0
+	for df in frames:
+		batch.append(df)
+		size += len(df)
+		if size >= rows:
+			yield _concat(batch,schema)
+			batch = []
+			size = 0
+	if batch:
+		yield _concat(batch,schema)
+
+
+if __name__ == "__main__":
+
+	## Running total of points by player over a season,
+	## without ever holding the whole season.
+	totals = None
+	for df in IterBoxScores(2018):
+		points = df.groupby("Player")["PTS"].sum()
+		totals = points if totals is None else totals.add(points,fill_value=0)
+	print(totals.sort_values(ascending=False).head(20))
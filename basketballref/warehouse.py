@@ -0,0 +1,205 @@
+"""warehouse.py
+
+A local columnar warehouse for scraped data. Frames from BoxScore, Player, SeasonSchedule, and
+Roster (or from a season harvest) are written to Parquet datasets, one per entity type, partitioned
+by season (i.e. root/boxscores/season=2018/part-....parquet).
+
+Appending only writes rows whose natural key isn't already stored, so reruns and overlapping
+crawls don't duplicate games. Reads go through pyarrow.dataset, so asking for a few columns of a
+few seasons only touches those columns in those partitions. Requires pyarrow. """
+import os
+import uuid
+import pandas as pd
+
+## Parquet IO
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+## From the bball lib
+from .box_score import BoxScore
+from .player import Player
+from .roster import Roster
+from .schedule import SeasonSchedule
+from .fetch import SeasonOf
+
+## Natural keys for each entity type. Note the uri is the box score uri
+## for box scores and schedules, and the player uri for gamelogs and rosters.
+KEYS = {"boxscores":["uri","Player"],
+		"gamelogs":["uri","date"],
+		"schedules":["uri"],
+		"rosters":["team","uri"]}
+
+## Arrow integer types that come back as pandas' nullable integers
+## when they have missing values (see schema.py).
+NULLABLE = {pa.int16():pd.Int16Dtype(),pa.int32():pd.Int32Dtype()}
+
+### Frame preparation
+######################################################################################
+def _frame(obj):
+
+	""" Turn one of the scraper objects into an (entity, long-format df with a season
+	column) pair. """
+
+	if isinstance(obj,BoxScore):
+		df = obj.df.reset_index()
+		df["uri"] = obj._uri
+		df["season"] = SeasonOf(df["date"])
+		return "boxscores", df
+	elif isinstance(obj,Player):
+		df = obj.df.reset_index()
+		df["uri"] = obj._uri
+		df["season"] = SeasonOf(df["date"])
+		return "gamelogs", df
+	elif isinstance(obj,SeasonSchedule):
+		df = obj.df.copy()
+		df["season"] = obj.season
+		return "schedules", df
+	elif isinstance(obj,Roster):
+		df = obj.df.copy()
+		df["team"] = obj._team
+		df["season"] = obj._season
+		return "rosters", df
+	raise TypeError("Can't store a {} in the warehouse.".format(type(obj).__name__))
+
+def _dataset(path,partitioning=None):
+
+	""" Open the parquet files under path as a dataset. The files can disagree on column
+	types (like count columns from before they were nullable integers, which were float32
+	when values were missing), so the file schemas are unified to a common type when needed. """
+
+	dataset = ds.dataset(path,format="parquet",partitioning=partitioning)
+	schemas = [f.physical_schema for f in dataset.get_fragments()]
+	if all(schema.equals(schemas[0]) for schema in schemas[1:]):
+		return dataset
+	schema = pa.unify_schemas(schemas+[dataset.schema],promote_options="permissive")
+	return ds.dataset(path,format="parquet",partitioning=partitioning,schema=schema)
+
+def _to_pandas(table):
+
+	""" Convert an arrow table to a dataframe with the scrapers' integer types, i.e. count
+	columns with missing values as nullable integers rather than float64. """
+
+	df = table.to_pandas(types_mapper=NULLABLE.get)
+	for column in df.columns:
+		if isinstance(df[column].dtype,(pd.Int16Dtype,pd.Int32Dtype)) and not df[column].hasnans:
+			df[column] = df[column].astype(df[column].dtype.numpy_dtype)
+	return df
+
+### Warehouse object
+######################################################################################
+class Warehouse(object):
+
+	""" Parquet datasets for each entity type under a root directory, partitioned by season. """
+
+	def __init__(self,root):
+
+		""" root = directory for the warehouse (created if needed). """
+
+		self.root = root
+		os.makedirs(root,exist_ok=True)
+
+	def __repr__(self):
+		return "Warehouse at {}".format(self.root)
+
+	def _partition(self,entity,season):
+		return os.path.join(self.root,entity,"season={:d}".format(int(season)))
+
+	def store(self,obj):
+
+		""" Append a BoxScore, Player, SeasonSchedule, or Roster to the warehouse.
+		Returns the number of new rows written. """
+
+		entity, df = _frame(obj)
+		return self.append(entity,df)
+
+	def append(self,entity,df):
+
+		""" Append a long-format frame (with the key columns in KEYS, and a season column
+		or a date column to get the season from) to entity's dataset, skipping rows that
+		are already stored. Returns the number of new rows written. """
+
+		## Date keys need a consistent type for matching against
+		## what's stored.
+		keys = KEYS[entity]
+		if "date" in df.columns:
+			df = df.assign(date=pd.to_datetime(df["date"]))
+		if "season" not in df.columns:
+			df = df.assign(season=SeasonOf(df["date"]))
+
+		## Work partition by partition
+		written = 0
+		for season, part in df.groupby("season",sort=True):
+			part = part.drop(columns=["season"]).drop_duplicates(subset=keys,keep="last")
+
+			## Drop anything that's already in the partition, which
+			## only requires reading the key columns.
+			path = self._partition(entity,season)
+			if os.path.isdir(path):
+				stored = _dataset(path).to_table(columns=keys).to_pandas()
+				stored = pd.MultiIndex.from_frame(stored[keys])
+				part = part.loc[~pd.MultiIndex.from_frame(part[keys]).isin(stored)]
+			if len(part) == 0:
+				continue
+
+			## Write the new rows as a new file in the partition
+			os.makedirs(path,exist_ok=True)
+			table = pa.Table.from_pandas(part,preserve_index=False)
+			pq.write_table(table,os.path.join(path,"part-{}.parquet".format(uuid.uuid4().hex)))
+			written += len(part)
+
+		return written
+
+	def read(self,entity,columns=None,seasons=None,filter=None):
+
+		""" Read entity's dataset into a dataframe.
+
+		columns: list of columns to read (all of them by default). The season column is always included.
+		seasons: list of seasons to read (partitions for other seasons aren't touched).
+		filter: an optional pyarrow.dataset expression for further row filtering, like ds.field("PTS") > 40. """
+
+		if columns is not None:
+			columns = list(columns)+(["season"] if "season" not in columns else [])
+		path = os.path.join(self.root,entity)
+		if not os.path.isdir(path):
+			return pd.DataFrame([],columns=columns)
+		dataset = _dataset(path,partitioning="hive")
+
+		## Build the row filter, starting with the partitions
+		expression = None
+		if seasons is not None:
+			expression = ds.field("season").isin([int(s) for s in seasons])
+		if filter is not None:
+			expression = filter if expression is None else expression & filter
+
+		return _to_pandas(dataset.to_table(columns=columns,filter=expression))
+
+	def seasons(self,entity):
+
+		""" The seasons stored for entity. """
+
+		path = os.path.join(self.root,entity)
+		if not os.path.isdir(path):
+			return []
+		return sorted(int(d.split("=")[1]) for d in os.listdir(path) if d.startswith("season="))
+
+	def compact(self,entity,season):
+
+		""" Rewrite a partition (which accumulates a file per append) as a single file. """
+
+		path = self._partition(entity,season)
+		files = [os.path.join(path,f) for f in os.listdir(path) if f.endswith(".parquet")]
+		if len(files) <= 1:
+			return
+		table = _dataset(files).to_table()
+		target = os.path.join(path,"part-{}.parquet".format(uuid.uuid4().hex))
+		pq.write_table(table,target)
+		for f in files:
+			os.remove(f)
+
+
+if __name__ == "__main__":
+
+	warehouse = Warehouse("warehouse")
+	print(warehouse.store(BoxScore("201805190CLE")))
+	print(warehouse.read("boxscores",columns=["Player","PTS","MP"],seasons=[2018]))
@@ -0,0 +1,120 @@
+"""bench_import.py
+
+Import time benchmarks for the package. Each statement is run in a fresh interpreter (so nothing
+is already imported), and the best wall time over the runs is reported, along with the time the
+interpreter takes to start up and do nothing, and which of the heavy dependencies (numpy, pandas,
+pyquery, lxml.html, pyarrow, matplotlib) the statement ended up importing.
+
+Usage:
+	python benchmarks/bench_import.py [--repeat N] [--save results.json]
+	python benchmarks/bench_import.py --compare results.json [--tolerance 0.2]
+
+With --compare, the run exits with status 1 if any statement got slower than the saved results
+by more than the tolerance (as a fraction, after subtracting the interpreter's start up time),
+or if it pulls in a heavy dependency it didn't before. """
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+## The local copy of the lib, which the child interpreters import
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Statements to time, from the cheapest entry points to
+## the full scrapers.
+STATEMENTS = ["pass",
+			  "import basketballref",
+			  "import basketballref.fetch",
+			  "import basketballref.archive",
+			  "from basketballref import Player",
+			  "import basketballref.crawl"]
+
+## Dependencies worth knowing about
+HEAVY = ["numpy","pandas","pyquery","lxml.html","pyarrow","matplotlib"]
+
+### Timing
+######################################################################################
+def _run(statement):
+
+	""" Run statement in a fresh interpreter, returning (wall seconds, heavy
+	modules it imported). """
+
+	code = "{}\nimport sys\nprint(','.join(m for m in {!r} if m in sys.modules))".format(statement,HEAVY)
+	start = time.perf_counter()
+	out = subprocess.run([sys.executable,"-c",code],cwd=ROOT,check=True,capture_output=True,text=True)
+	seconds = time.perf_counter()-start
+	return seconds, [m for m in out.stdout.strip().split(",") if m]
+
+def RunBenchmarks(repeat=5):
+
+	""" Time every statement. Returns a dict of statement -> {"seconds", "import_seconds"
+	(with the start up time taken out), "heavy"}. """
+
+	results = {}
+	for statement in STATEMENTS:
+		best = float("inf")
+		for _ in range(repeat):
+			seconds, heavy = _run(statement)
+			best = min(best,seconds)
+		results[statement] = {"seconds":best,"heavy":heavy}
+	startup = results["pass"]["seconds"]
+	for result in results.values():
+		result["import_seconds"] = max(0.,result["seconds"]-startup)
+	return results
+
+### Reporting
+######################################################################################
+def Report(results,baseline=None,tolerance=0.2):
+
+	""" Print a table of the results, with the change against baseline if it's given. Returns
+	the list of regressions, (statement, description) tuples. """
+
+	regressions = []
+	print("{:<36s} {:>9s} {:>9s} {:>8s}  {}".format("statement","total ms","import ms","change","heavy imports"))
+	for statement, result in results.items():
+		base = (baseline or {}).get(statement)
+		change = ""
+		if base is not None and statement != "pass":
+
+			## Ignore tiny baselines, where the noise swamps
+			## any real change.
+			if base["import_seconds"] > 0.01:
+				slowdown = result["import_seconds"]/base["import_seconds"]-1.
+				change = "{:+.0%}".format(slowdown)
+				if slowdown > tolerance:
+					regressions.append((statement,"{} slower".format(change)))
+			added = sorted(set(result["heavy"])-set(base["heavy"]))
+			if added:
+				regressions.append((statement,"now imports {}".format(", ".join(added))))
+		print("{:<36s} {:>9.1f} {:>9.1f} {:>8s}  {}".format(statement,1000*result["seconds"],
+			  1000*result["import_seconds"],change,", ".join(result["heavy"]) or "-"))
+	return regressions
+
+
+if __name__ == "__main__":
+
+	args = argparse.ArgumentParser(description="Benchmark the package's import time.")
+	args.add_argument("--repeat",type=int,default=5,help="runs per statement (the best one is reported)")
+	args.add_argument("--save",help="write the results to this json file")
+	args.add_argument("--compare",help="json file of earlier results to check for regressions against")
+	args.add_argument("--tolerance",type=float,default=0.2,help="allowed slowdown as a fraction (default 0.2)")
+	args = args.parse_args()
+
+	results = RunBenchmarks(args.repeat)
+	baseline = None
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+	regressions = Report(results,baseline,args.tolerance)
+
+	if args.save:
+		with open(args.save,"w") as f:
+			json.dump(results,f,indent=2)
+
+	if regressions:
+		print("\nRegressions:")
+		for statement, description in regressions:
+			print("  {}: {}".format(statement,description))
+		sys.exit(1)
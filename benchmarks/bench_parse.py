@@ -0,0 +1,161 @@
+"""bench_parse.py
+
+Offline benchmarks for the page parsers, run against the pages in benchmarks/fixtures
+(so no network access is needed and the numbers are comparable between runs). For each page, the
+parse stage (HTML to a frame of strings), the conversion stage (the schema type conversion), and
+the two together are timed separately, and reported as pages/sec, rows/sec, and peak memory
+(as traced by tracemalloc, so Python allocations only, not lxml's internal ones).
+
+Usage:
+	python benchmarks/bench_parse.py [--repeat N] [--save results.json]
+	python benchmarks/bench_parse.py --compare results.json [--tolerance 0.2]
+
+With --compare, the run exits with status 1 if any stage got slower than the saved
+results by more than the tolerance (as a fraction), or if a page no longer parses. """
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from pyquery import PyQuery as pq
+
+## Use the local copy of the lib
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from basketballref import box_score, player, roster, schedule
+from basketballref.schema import ConvertTypes
+
+## The corpus
+from corpus import FIXTURES, LoadFixture
+
+### The parsers, split into stages
+######################################################################################
+def _player_list_convert(df):
+	return ConvertTypes(df,player.PLAYER_LIST_SCHEMA)
+
+## fixture -> (name, parse stage, conversion stage, function to pull the
+## stats frame out of the parse stage's output)
+PARSERS = {"boxscore_old.html":("box_score",box_score._process_webpage,box_score._type_convert,lambda out: out[4]),
+		   "boxscore_modern.html":("box_score",box_score._process_webpage,box_score._type_convert,lambda out: out[4]),
+		   "gamelog.html":("player",player._process_webpage,player._type_convert,lambda out: out),
+		   "schedule_lockout.html":("schedule",schedule._process_webpage,schedule._type_convert,lambda out: out),
+		   "roster.html":("roster",roster._process_webpage,roster._type_convert,lambda out: out[1]),
+		   "players.html":("player_list",player._process_player_list,_player_list_convert,lambda out: out)}
+
+### Timing
+######################################################################################
+def _measure(func,repeat):
+
+	""" Run func repeat times, returning (best time per call in seconds, peak traced
+	memory in bytes over one call, the last output). The memory is traced on a separate
+	call, so tracemalloc's overhead doesn't end up in the timings. """
+
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		out = func()
+		best = min(best,time.perf_counter()-start)
+
+	tracemalloc.start()
+	func()
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return best, peak, out
+
+def BenchmarkFixture(fixture,repeat=5):
+
+	""" Benchmark the parse and conversion stages on one fixture page. Returns a dict
+	of stage -> {"seconds", "pages_per_sec", "rows_per_sec", "peak_mb"}, with the number
+	of rows in the frame the page parses to. """
+
+	name, parse, convert, frame = PARSERS[fixture]
+	text = LoadFixture(fixture)
+
+	## Each stage gets its own input, built outside of the timing
+	parsed = parse(pq(text,parser="html"))
+	raw = frame(parsed)
+	stages = {"parse":lambda: parse(pq(text,parser="html")),
+			  "convert":lambda: convert(raw.copy()),
+			  "total":lambda: convert(frame(parse(pq(text,parser="html"))))}
+
+	results = {"parser":name,"rows":len(raw)}
+	for stage, func in stages.items():
+		seconds, peak, _ = _measure(func,repeat)
+		results[stage] = {"seconds":seconds,
+						  "pages_per_sec":1./seconds,
+						  "rows_per_sec":len(raw)/seconds,
+						  "peak_mb":peak/1024.**2}
+	return results
+
+def RunBenchmarks(repeat=5):
+
+	""" Benchmark every fixture. Pages that fail to parse get an error entry
+	instead of timings. """
+
+	results = {}
+	for fixture in FIXTURES:
+		try:
+			results[fixture] = BenchmarkFixture(fixture,repeat)
+		except Exception as error:
+			results[fixture] = {"parser":PARSERS[fixture][0],"error":"{}: {}".format(type(error).__name__,error)}
+	return results
+
+### Reporting
+######################################################################################
+def Report(results,baseline=None,tolerance=0.2):
+
+	""" Print a table of the results, with the change against baseline if it's given. Returns
+	the list of regressions, (fixture, stage, description) tuples. """
+
+	regressions = []
+	print("{:<22s} {:<8s} {:>6s} {:>10s} {:>12s} {:>10s} {:>9s}".format("fixture","stage","rows","pages/s","rows/s","peak MB","change"))
+	for fixture, result in results.items():
+		base = (baseline or {}).get(fixture)
+
+		## Pages that don't parse
+		if "error" in result:
+			print("{:<22s} {}".format(fixture,result["error"]))
+			if base is not None and "error" not in base:
+				regressions.append((fixture,"all","no longer parses"))
+			continue
+
+		for stage in ("parse","convert","total"):
+			timing = result[stage]
+			change = ""
+			if base is not None and stage in base:
+				slowdown = timing["seconds"]/base[stage]["seconds"]-1.
+				change = "{:+.0%}".format(slowdown)
+				if slowdown > tolerance:
+					regressions.append((fixture,stage,"{} slower".format(change)))
+			print("{:<22s} {:<8s} {:>6d} {:>10.1f} {:>12.0f} {:>10.2f} {:>9s}".format(fixture,stage,result["rows"],
+				  timing["pages_per_sec"],timing["rows_per_sec"],timing["peak_mb"],change))
+
+	return regressions
+
+
+if __name__ == "__main__":
+
+	args = argparse.ArgumentParser(description="Benchmark the page parsers on the fixture pages.")
+	args.add_argument("--repeat",type=int,default=5,help="runs per stage (the best one is reported)")
+	args.add_argument("--save",help="write the results to this json file")
+	args.add_argument("--compare",help="json file of earlier results to check for regressions against")
+	args.add_argument("--tolerance",type=float,default=0.2,help="allowed slowdown as a fraction (default 0.2)")
+	args = args.parse_args()
+
+	results = RunBenchmarks(args.repeat)
+	baseline = None
+	if args.compare:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+	regressions = Report(results,baseline,args.tolerance)
+
+	if args.save:
+		with open(args.save,"w") as f:
+			json.dump(results,f,indent=2)
+
+	if regressions:
+		print("\nRegressions:")
+		for fixture, stage, description in regressions:
+			print("  {} ({}): {}".format(fixture,stage,description))
+		sys.exit(1)
@@ -0,0 +1,38 @@
+"""corpus.py
+
+The pages used by the offline benchmarks, as fixture file name -> the URL whose page it stands
+in for. The committed pages in benchmarks/fixtures are synthesized in the shape of those pages
+(see synthesize_fixtures.py), not recorded from them, and record_fixtures.py replaces them with the
+live pages from these URLs. """
+import os
+
+## Where the pages are stored
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),"fixtures")
+
+## The pages, chosen to cover the layouts the parsers have to handle.
+FIXTURES = {
+	## Pre-2020 box score, with only the basic and advanced tables for each team
+	"boxscore_old.html":"https://www.basketball-reference.com/boxscores/200212020PHO.html",
+
+	## Current box score layout, with quarter and half tables for each team
+	"boxscore_modern.html":"https://www.basketball-reference.com/boxscores/202306120DEN.html",
+
+	## Gamelog with the playoff table hidden in an HTML comment
+	"gamelog.html":"https://www.basketball-reference.com/players/j/jamesle01/gamelog/2018",
+
+	## First month of the 2011-12 lockout season (october and november don't exist)
+	"schedule_lockout.html":"https://www.basketball-reference.com/leagues/NBA_2012_games-december.html",
+
+	## Team roster
+	"roster.html":"https://www.basketball-reference.com/teams/PHO/2019.html",
+
+	## One letter of the player list
+	"players.html":"https://www.basketball-reference.com/players/a/",
+}
+
+def LoadFixture(name):
+
+	""" The HTML text of a fixture page. """
+
+	with open(os.path.join(FIXTURE_DIR,name),encoding="utf-8") as f:
+		return f.read()
@@ -0,0 +1,25 @@
+"""record_fixtures.py
+
+Record (or re-record) the benchmark corpus from the live site, through the package's fetch
+layer so the usual rate limits apply. The pages checked into benchmarks/fixtures were built by
+synthesize_fixtures.py to follow the site's markup. Running this replaces them with real pages,
+so check the benchmark numbers against the same corpus before and after. """
+import os
+import sys
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),".."))
+
+## From the bball lib
+from basketballref.fetch import FetchPage
+
+## The corpus
+from corpus import FIXTURE_DIR, FIXTURES
+
+if __name__ == "__main__":
+
+	## Fetch each page and store it
+	os.makedirs(FIXTURE_DIR,exist_ok=True)
+	for name, url in FIXTURES.items():
+		text = FetchPage(url)
+		with open(os.path.join(FIXTURE_DIR,name),"w",encoding="utf-8") as f:
+			f.write(text)
+		print("{}: {} ({:.0f} kB)".format(name,url,len(text)/1024.))
@@ -0,0 +1,296 @@
+"""synthesize_fixtures.py
+
+Build the benchmark corpus without network access. The pages follow the markup the parsers
+rely on (data-stat tagged cells, thead sub-heading rows, tables hidden in HTML comments, the
+page chrome around the tables), with seeded random stat lines, so the benchmark numbers are
+reproducible. Use record_fixtures.py to replace them with pages from the live site. """
+import os
+import random
+
+## The corpus
+from corpus import FIXTURE_DIR
+
+## Column (data-stat, label) lists for the different tables
+BASIC = [("mp","MP"),("fg","FG"),("fga","FGA"),("fg_pct","FG%"),("fg3","3P"),("fg3a","3PA"),("fg3_pct","3P%"),
+		 ("ft","FT"),("fta","FTA"),("ft_pct","FT%"),("orb","ORB"),("drb","DRB"),("trb","TRB"),("ast","AST"),
+		 ("stl","STL"),("blk","BLK"),("tov","TOV"),("pf","PF"),("pts","PTS"),("plus_minus","+/-")]
+MODERN_BASIC = BASIC+[("game_score","GmSc")]
+ADVANCED = [("mp","MP"),("ts_pct","TS%"),("efg_pct","eFG%"),("fg3a_per_fga_pct","3PAr"),("fta_per_fga_pct","FTr"),
+			("orb_pct","ORB%"),("drb_pct","DRB%"),("trb_pct","TRB%"),("ast_pct","AST%"),("stl_pct","STL%"),
+			("blk_pct","BLK%"),("tov_pct","TOV%"),("usg_pct","USG%"),("off_rtg","ORtg"),("def_rtg","DRtg"),("bpm","BPM")]
+GAMELOG = [("date_game","Date"),("game_season","G"),("age","Age"),("team_id","Tm"),("game_location",""),
+		   ("opp_id","Opp"),("game_result",""),("gs","GS")]+BASIC[:-1]+[("game_score","GmSc"),("plus_minus","+/-")]
+
+### Page pieces
+######################################################################################
+def _chrome(body,title):
+
+	""" Wrap body in the kind of page chrome (navigation, scripts, footer) that
+	surrounds the tables on the site. """
+
+	nav = "\n".join('<li><a href="/leagues/NBA_{0}.html">{1}-{2} NBA</a></li>'.format(y,y-1,str(y)[2:]) for y in range(1950,2024))
+	script = "<script>var sr_config = {};" + "".join("sr_config.k%d = %d;" % (i,i) for i in range(300)) + "</script>"
+	return ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{0}</title>{1}</head><body>'
+			'<div id="wrap"><div id="header"><ul class="nav">{2}</ul></div>{3}'
+			'<div id="footer"><p>Copyright &copy; Sports Reference LLC</p><ul>{2}</ul></div></div></body></html>').format(title,script,nav,body)
+
+def _commented(html):
+
+	""" Hide html in a comment, the way the site ships secondary tables. """
+
+	return '<div class="placeholder"></div>\n<!--\n{}\n-->\n'.format(html)
+
+def _stat(rng,stat):
+
+	""" A random, but plausible, cell value for stat. """
+
+	if stat == "mp":
+		return "{:d}:{:02d}".format(rng.randint(1,44),rng.randint(0,59))
+	if stat.endswith("pct"):
+		return rng.choice(["",".{:03d}".format(rng.randint(0,999)),"1.000"])
+	if stat == "plus_minus":
+		return rng.choice(["+{:d}".format(rng.randint(1,20)),"-{:d}".format(rng.randint(1,20)),"0"])
+	if stat in ("off_rtg","def_rtg"):
+		return str(rng.randint(60,160))
+	if stat in ("bpm","game_score"):
+		return "{:.1f}".format(rng.uniform(-10,30))
+	return str(rng.randint(0,15))
+
+### Box scores
+######################################################################################
+def _box_table(rng,table_id,caption,players,columns,header):
+
+	""" One team's box score table, with a Reserves sub-heading and a couple of
+	players who didn't play. """
+
+	html = ['<div class="table_wrapper" id="all_{0}"><table class="sortable stats_table" id="{0}" data-cols-to-freeze=",1">'.format(table_id),
+			"<caption>{}</caption>".format(caption),
+			'<thead><tr class="over_header"><th aria-label="" data-stat="" colspan="1"></th>'
+			'<th aria-label="" data-stat="header_tmp" colspan="{}" class="over_header center">{}</th></tr>'.format(len(columns),header),
+			'<tr><th aria-label="Starters" data-stat="player" scope="col" class="poptip sort_default_asc left">Starters</th>']
+	html += ['<th aria-label="{1}" data-stat="{0}" scope="col" class="poptip center">{1}</th>'.format(stat,label) for stat, label in columns]
+	html.append("</tr></thead><tbody>")
+	for i, (uri, name) in enumerate(players):
+		if i == 5:
+			html.append('<tr class="thead"><th data-stat="player" scope="row" class="left">Reserves</th>'
+						+"".join('<td data-stat="{}" class="center">{}</td>'.format(s,l) for s, l in columns)+"</tr>")
+		html.append('<tr><th scope="row" class="left" data-append-csv="{0}" data-stat="player" csk="{1}">'
+					'<a href="/players/{2}/{0}.html">{1}</a></th>'.format(uri,name,uri[0]))
+		if i >= len(players)-2:
+			html.append('<td class="center iz" data-stat="reason" colspan="{}">Did Not Play</td></tr>'.format(len(columns)))
+			continue
+		html += ['<td class="right" data-stat="{}">{}</td>'.format(s,_stat(rng,s)) for s, _ in columns]
+		html.append("</tr>")
+	html.append('</tbody><tfoot><tr><th scope="row" class="left" data-stat="player">Team Totals</th>'
+				+"".join('<td class="right" data-stat="{}">{}</td>'.format(s,_stat(rng,s)) for s, _ in columns)+"</tr></tfoot></table></div>")
+	return "\n".join(html)
+
+def _players(rng,team,n=14):
+	return [("{}pl{:02d}".format(team.lower(),i),"{} Player {}".format(team,i)) for i in range(n)]
+
+def BoxScorePage(rng,modern):
+
+	""" A box score page, in the current layout (basic tables for the game and each quarter
+	and half, then advanced) or the older one (just basic and advanced). """
+
+	if modern:
+		teams = [("MIA","Miami Heat"),("DEN","Denver Nuggets")]
+		title = "Miami Heat at Denver Nuggets Box Score, June 12, 2023"
+	else:
+		teams = [("UTA","Utah Jazz"),("PHO","Phoenix Suns")]
+		title = "Utah Jazz at Phoenix Suns Box Score, December 2, 2002"
+
+	## Header, and the commented out line score and four factors
+	body = ['<div id="content" role="main"><h1>{}</h1>'.format(title),
+			'<div class="scorebox"><div><strong><a href="/teams/{0}/2023.html">{1}</a></strong></div></div>'.format(*teams[0])]
+	body.append('<div class="table_wrapper" id="all_line_score">'+_commented(
+		'<table class="suppress_all stats_table" id="line_score"><caption>Line Score Table</caption><thead><tr><th data-stat="team">&nbsp;</th>'
+		+"".join('<th data-stat="{0}">{0}</th>'.format(q) for q in ("1","2","3","4","T"))+'</tr></thead><tbody>'
+		+"".join('<tr><th data-stat="team"><a href="/teams/{0}/2023.html">{0}</a></th>'.format(t)
+				 +"".join('<td data-stat="{}">{}</td>'.format(q,rng.randint(15,35)) for q in ("1","2","3","4","T"))+"</tr>" for t, _ in teams)
+		+"</tbody></table>")+"</div>")
+	body.append('<div class="table_wrapper" id="all_four_factors">'+_commented(
+		'<table class="suppress_all stats_table" id="four_factors"><caption>Four Factors Table</caption><thead><tr><th data-stat="team_id">&nbsp;</th>'
+		'<th data-stat="pace">Pace</th><th data-stat="efg_pct">eFG%</th></tr></thead><tbody>'
+		+"".join('<tr><th data-stat="team_id">{}</th><td data-stat="pace">96.{}</td><td data-stat="efg_pct">.5{}</td></tr>'.format(t,i,i)
+				 for i, (t, _) in enumerate(teams))+"</tbody></table>")+"</div>")
+
+	## Team tables
+	for abbr, name in teams:
+		players = _players(rng,abbr)
+		if modern:
+			body.append(_box_table(rng,"box-{}-game-basic".format(abbr),"{} Basic and Advanced Stats Table".format(name),
+								   players,MODERN_BASIC,"Basic Box Score Stats"))
+			for period in ("q1","q2","q3","q4","h1","h2"):
+				body.append(_box_table(rng,"box-{}-{}-basic".format(abbr,period),"{} Basic and Advanced Stats Table".format(name),
+									   players,MODERN_BASIC,"Basic Box Score Stats"))
+			body.append(_box_table(rng,"box-{}-game-advanced".format(abbr),"{} Basic and Advanced Stats Table".format(name),
+								   players,ADVANCED,"Advanced Box Score Stats"))
+		else:
+			body.append(_box_table(rng,"box_{}_basic".format(abbr.lower()),"{} ({}-{}) Table".format(name,10,8),
+								   players,BASIC,"Basic Box Score Stats"))
+			body.append(_box_table(rng,"box_{}_advanced".format(abbr.lower()),"{} ({}-{}) Table".format(name,10,8),
+								   players,ADVANCED,"Advanced Box Score Stats"))
+	body.append("</div>")
+	return _chrome("\n".join(body),title+" | Basketball-Reference.com")
+
+### Gamelogs
+######################################################################################
+def _gamelog_table(rng,table_id,caption,n,start):
+
+	""" A gamelog table with n games starting on day start of the season, including
+	repeated header rows and games the player sat out. """
+
+	html = ['<table class="row_summable sortable stats_table" id="{}" data-cols-to-freeze=",2">'.format(table_id),
+			"<caption>{}</caption><colgroup>{}</colgroup>".format(caption,"<col>"*(len(GAMELOG)+1)),
+			'<thead><tr><th aria-label="Rank" data-stat="ranker" scope="col" class="ranker">Rk</th>'
+			+"".join('<th aria-label="{}" data-stat="{}" scope="col">{}</th>'.format(label or stat,stat,label) for stat, label in GAMELOG)
+			+"</tr></thead><tbody>"]
+	played = 0
+	for i in range(n):
+		if i and i%20 == 0:
+			html.append('<tr class="thead"><th data-stat="ranker">Rk</th>'
+						+"".join('<th data-stat="{}">{}</th>'.format(s,l) for s, l in GAMELOG)+"</tr>")
+		day = start+i*2
+		date = "2018-{:02d}-{:02d}".format(1+day//28,1+day%28)
+		location = rng.choice(["","@"])
+		opponent = rng.choice(["BOS","GSW","TOR","HOU","MIL"])
+		result = rng.choice(["W (+{})".format(rng.randint(1,20)),"L (-{})".format(rng.randint(1,20))])
+		## Games the player sat out have a reason cell in
+		## place of the game number and stats.
+		inactive = i%17 == 5
+		if not inactive:
+			played += 1
+		row = ['<tr id="{}.{}"><th scope="row" class="right" data-stat="ranker" csk="{}">{}</th>'.format(table_id,i,i,i+1),
+			   '<td data-stat="game_season">{}</td>'.format("" if inactive else played),
+			   '<td data-stat="date_game"><a href="/boxscores/{}0{}.html">{}</a></td>'.format(date.replace("-",""),opponent,date),
+			   '<td data-stat="age">33-{:03d}</td>'.format(100+i),
+			   '<td data-stat="team_id"><a href="/teams/CLE/2018.html">CLE</a></td>',
+			   '<td data-stat="game_location">{}</td>'.format(location),
+			   '<td data-stat="opp_id"><a href="/teams/{0}/2018.html">{0}</a></td>'.format(opponent),
+			   '<td data-stat="game_result" csk="1">{}</td>'.format(result)]
+		if inactive:
+			row.append('<td class="center iz" data-stat="reason" colspan="{}">Inactive</td>'.format(len(GAMELOG)-7))
+		else:
+			row.append('<td data-stat="gs">1</td>')
+			row += ['<td data-stat="{}">{}</td>'.format(s,_stat(rng,s)) for s, _ in GAMELOG[8:]]
+		html.append("".join(row)+"</tr>")
+	html.append("</tbody></table>")
+	return "\n".join(html)
+
+def GamelogPage(rng):
+
+	""" A regular season gamelog, with the playoffs in a commented out table. """
+
+	body = ['<div id="content" role="main"><h1>LeBron James 2017-18 Game Log</h1>',
+			'<div class="table_wrapper" id="all_pgl_basic">',_gamelog_table(rng,"pgl_basic","Regular Season Table",82,0),"</div>",
+			'<div class="table_wrapper" id="all_pgl_basic_playoffs">',
+			_commented(_gamelog_table(rng,"pgl_basic_playoffs","Playoffs Table",22,100)),"</div></div>"]
+	return _chrome("\n".join(body),"LeBron James 2017-18 Game Log | Basketball-Reference.com")
+
+### Schedules, rosters, and the player list
+######################################################################################
+TEAMS = [("ATL","Atlanta Hawks"),("BOS","Boston Celtics"),("CHI","Chicago Bulls"),("DAL","Dallas Mavericks"),
+		 ("DEN","Denver Nuggets"),("LAL","Los Angeles Lakers"),("MIA","Miami Heat"),("NYK","New York Knicks"),
+		 ("OKC","Oklahoma City Thunder"),("PHO","Phoenix Suns"),("SAS","San Antonio Spurs"),("UTA","Utah Jazz")]
+
+def SchedulePage(rng):
+
+	""" The first month of the 2011-12 lockout season (which started on Christmas). """
+
+	columns = [("date_game","Date"),("game_start_time","Start (ET)"),("visitor_team_name","Visitor/Neutral"),
+			   ("visitor_pts","PTS"),("home_team_name","Home/Neutral"),("home_pts","PTS"),("box_score_text","&nbsp;"),
+			   ("overtimes","&nbsp;"),("attendance","Attend."),("game_remarks","Notes")]
+	rows = []
+	for i in range(40):
+		day = 25+i//7
+		(away, away_name), (home, home_name) = rng.sample(TEAMS,2)
+		uri = "201112{:02d}0{}".format(day,home)
+		rows.append('<tr><th scope="row" class="left" data-stat="date_game" csk="{0}">'
+					'<a href="/boxscores/index.fcgi?month=12&amp;day={1}&amp;year=2011">Sun, Dec {1}, 2011</a></th>'
+					'<td class="right" data-stat="game_start_time">12:00p</td>'
+					'<td class="left" data-stat="visitor_team_name" csk="{2}.{0}"><a href="/teams/{2}/2012.html">{3}</a></td>'
+					'<td class="right" data-stat="visitor_pts">{4}</td>'
+					'<td class="left" data-stat="home_team_name" csk="{5}.{0}"><a href="/teams/{5}/2012.html">{6}</a></td>'
+					'<td class="right" data-stat="home_pts">{7}</td>'
+					'<td class="center" data-stat="box_score_text"><a href="/boxscores/{0}.html">Box Score</a></td>'
+					'<td class="center" data-stat="overtimes">{8}</td><td class="right" data-stat="attendance">{9:,d}</td>'
+					'<td class="left" data-stat="game_remarks"></td></tr>'.format(uri,day,away,away_name,rng.randint(80,125),
+																				  home,home_name,rng.randint(80,125),
+																				  rng.choice(["","","OT"]),rng.randint(14000,22000)))
+	table = ('<div class="table_wrapper" id="all_schedule"><table class="suppress_glossary sortable stats_table" id="schedule">'
+			 '<caption>December Schedule Table</caption><thead><tr>'
+			 +"".join('<th aria-label="{1}" data-stat="{0}" scope="col">{1}</th>'.format(s,l) for s, l in columns)
+			 +"</tr></thead><tbody>"+"\n".join(rows)+"</tbody></table></div>")
+	return _chrome('<div id="content" role="main"><h1>2011-12 NBA Schedule</h1>'+table+"</div>",
+				   "2011-12 NBA Schedule | Basketball-Reference.com")
+
+def RosterPage(rng):
+
+	""" The 2018-19 Suns roster page (roster table only). """
+
+	rows = []
+	for i in range(17):
+		number = "" if i == 16 else str(rng.randint(0,99))
+		rows.append('<tr><th scope="row" class="center" data-stat="number">{0}</th>'
+					'<td class="left" data-append-csv="phopl{1:02d}" data-stat="player" csk="Player,{1}">'
+					'<a href="/players/p/phopl{1:02d}.html">Suns Plàyer {1}</a></td>'
+					'<td class="center" data-stat="pos">G</td><td class="right" data-stat="height" csk="78.0">6-6</td>'
+					'<td class="right" data-stat="weight">{2}</td><td class="left" data-stat="birth_date" csk="19961030">'
+					'<a href="/friv/birthdays.fcgi?month=10&amp;day=30">October 30, 1996</a></td>'
+					'<td class="center" data-stat="birth_country"><span class="f-i f-us">us</span></td>'
+					'<td class="right" data-stat="years_experience">{3}</td>'
+					'<td class="left" data-stat="college"><a href="/friv/colleges.fcgi?college=kentucky">Kentucky</a></td></tr>'.format(
+						number,i,rng.randint(180,260),rng.choice(["R","1","3","10"])))
+	header = ('<div id="info"><div id="meta"><div><h1><span>2018-19</span> <span>Phoenix Suns</span> Roster and Stats</h1>'
+			  '<p>About logos</p>\n<p><strong>Record:</strong> 19-63, Finished 15th in NBA Western Conference</p>\n'
+			  '<p><strong>Coach:</strong> Igor Kokoskov (19-63)</p>\n<p><strong>Executive:</strong> James Jones</p></div></div>\n'
+			  '<p>More Team Info</p></div>')
+	table = ('<div class="table_wrapper" id="all_roster"><table class="sortable stats_table" id="roster"><caption>Roster Table</caption><thead><tr>'
+			 +"".join('<th aria-label="{1}" data-stat="{0}" scope="col">{1}</th>'.format(s,l) for s, l in
+					  [("number","No."),("player","Player"),("pos","Pos"),("height","Ht"),("weight","Wt"),("birth_date","Birth Date"),
+					   ("birth_country","&nbsp;"),("years_experience","Exp"),("college","College")])
+			 +"</tr></thead><tbody>"+"\n".join(rows)+"</tbody></table></div>")
+	return _chrome(header+'<div id="content" role="main">'+table+"</div>","2018-19 Phoenix Suns Roster and Stats | Basketball-Reference.com")
+
+def PlayersPage(rng):
+
+	""" One letter of the player list. """
+
+	rows = []
+	for i in range(500):
+		name = ("Jósé A{}" if i%7 == 0 else "Player A{}").format(i)
+		uri = "apl{:03d}01".format(i)
+		first = rng.randint(1947,2023)
+		rows.append('<tr><th scope="row" class="left" data-append-csv="{0}" data-stat="player"><a href="/players/a/{0}.html">{1}</a>{2}</th>'
+					'<td class="right" data-stat="year_min">{3}</td><td class="right" data-stat="year_max">{4}</td>'
+					'<td class="center" data-stat="pos">{5}</td><td class="right" data-stat="height" csk="78.0">6-6</td>'
+					'<td class="right" data-stat="weight">{6}</td><td class="left" data-stat="birth_date" csk="19961030">'
+					'<a href="/friv/birthdays.fcgi?month=10&amp;day=30">October 30, 1996</a></td>'
+					'<td class="left" data-stat="colleges"><a href="/friv/colleges.fcgi?college=kentucky">Kentucky</a></td></tr>'.format(
+						uri,name,"*" if i%9 == 0 else "",first,min(first+rng.randint(0,15),2023),rng.choice(["G","F","C","G-F","F-C"]),
+						rng.randint(160,280)))
+	table = ('<div class="table_wrapper" id="all_players"><table class="sortable stats_table" id="players"><caption>Players Table</caption><thead><tr>'
+			 +"".join('<th aria-label="{1}" data-stat="{0}" scope="col">{2}</th>'.format(s,a,l) for s, a, l in
+					  [("player","Player","Player"),("year_min","First Year","From"),("year_max","Last Year","To"),("pos","Position","Pos"),
+					   ("height","Height","Ht"),("weight","Weight","Wt"),("birth_date","Birth Date","Birth Date"),("colleges","Colleges","Colleges")])
+			 +"</tr></thead><tbody>"+"\n".join(rows)+"</tbody></table></div>")
+	return _chrome('<div id="content" role="main"><h1>Players Index: A</h1>'+table+"</div>","Players Index: A | Basketball-Reference.com")
+
+
+if __name__ == "__main__":
+
+	## Build each page from its own seed, so the pages don't
+	## change when one of the builders does.
+	pages = {"boxscore_old.html":lambda rng: BoxScorePage(rng,False),
+			 "boxscore_modern.html":lambda rng: BoxScorePage(rng,True),
+			 "gamelog.html":GamelogPage,
+			 "schedule_lockout.html":SchedulePage,
+			 "roster.html":RosterPage,
+			 "players.html":PlayersPage}
+	os.makedirs(FIXTURE_DIR,exist_ok=True)
+	for seed, (name, build) in enumerate(pages.items()):
+		text = build(random.Random(seed))
+		with open(os.path.join(FIXTURE_DIR,name),"w",encoding="utf-8") as f:
+			f.write(text)
+		print("{}: {:.0f} kB".format(name,len(text)/1024.))
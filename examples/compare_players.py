@@ -11,42 +11,51 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 ## From the bball lib
-from basketballref.player import Player, GetPlayerList
-import basketballref.plot_env 
+from basketballref.player import Player
+from basketballref.directory import PlayerDirectory
+from basketballref.collection import PlayerCollection
+from basketballref.derived import Rolling
+from basketballref.plot_env import UsePlotStyle
 
 ## For progress bars
 from tqdm import tqdm
 
-def ProcessPlayers(players,player_list,advanced=True):
+def ProcessPlayers(players,directory,advanced=True):
 
 	""" Function to create a dictionary of Player object inputs for
 	each player in players. """
 
-	## Subset the player list and type convert
-	## into a list of dictionaries for each
-	player_info = player_list.loc[player_list.player.isin(players)].to_dict("records")
+	## Resolve the names to (uri, first_year, last_year) records
+	## via the player directory's name index
+	player_info = directory.resolve(players)
 
 	## Reframe that into the appropiate dictionary of 
-	## tuples.	
-	output = {d["player"]:(d["uri"],range(d["first_year"],d["last_year"]+1),advanced) for d in player_info}
+	## tuples, skipping names that couldn't be found.
+	output = {player:(info[0],range(info[1],info[2]+1),advanced) for player, info in player_info.items() if info is not None}
 	return output
 
 if __name__ == "__main__":
 
+	## Use the package's plot style
+	UsePlotStyle()
+
 	## Choose the players you want to compare
 	players = ["Michael Jordan","James Harden","Devin Booker"]
 
 	## Get the lookup table to find their active years
-	## and their URIs
-	player_list = GetPlayerList(letters="bhj")
+	## and their URIs (saved to disk after the first run)
+	directory = PlayerDirectory(letters="bhj")
 	
 	## Scrape their stats
-	p_inputs = ProcessPlayers(players,player_list,advanced=False)
+	p_inputs = ProcessPlayers(players,directory,advanced=False)
 	print("\nScraping player statistics...")
-	data = {player:Player(*inputs).df for player, inputs in tqdm(p_inputs.items())}
+	data = PlayerCollection({player:Player(*inputs).df for player, inputs in tqdm(p_inputs.items())})
 
-	## Plot their career time series
+	## Plot their career time series, with 10 game rolling
+	## averages computed for everyone at once.
 	to_plot = ["PTS","AST","TRB","GmSc"]
+	stacked = data.df.reset_index()
+	rolling = stacked[["player","date"]].join(Rolling(stacked,columns=to_plot,window=10))
 	fig, axes = plt.subplots(len(players),1,figsize=(16,12),sharey=True,sharex=True)
 
 	## Loop and plot
@@ -57,8 +66,10 @@ if __name__ == "__main__":
 
 		## Plot the timeseries
 		axes[p].grid(color="grey",alpha=0.2)
+		trend = rolling.loc[rolling["player"] == player]
 		for i, c in enumerate(to_plot):
-			axes[p].plot(df.index,df[c].values,ls="None",marker="o",color="C"+str(i))
+			axes[p].plot(df.index,df[c].astype(float).values,ls="None",marker="o",alpha=0.4,color="C"+str(i))
+			axes[p].plot(trend["date"],trend[c+"_10"].values,lw=2,color="C"+str(i))
 		
 		## Label the plot
 		axes[p].text(0.025,0.95,player,fontsize="28",color="k",